@@ -1,9 +1,12 @@
-import pandas as pd
-from statsmodels.stats.outliers_influence import variance_inflation_factor
-from sklearn.preprocessing import StandardScaler
+from data_cache import load_table
+from ols import Gram, vif
+from regression_grid import GRID, expand_grid, load_design, run_vif
+
+# VIFs above this are reported as problematic
+VIF_THRESHOLD = 5
 
 # データ読み込み
-df = pd.read_csv("panel_with_all_pca.csv")
+df = load_table("panel_with_all_pca")
 
 # 各ポジション別に多重共線性をチェック
 position_scores = [
@@ -15,18 +18,32 @@ position_scores = [
 
 for pos_score in position_scores:
     # 該当ポジションのデータのみ（NaNでないもの）
-    X = df[["performance_composite_score", pos_score]].dropna()
-    
-    if len(X) > 0:
-        # 標準化
-        X_std = StandardScaler().fit_transform(X)
-        
-        # VIF計算
-        vif_df = pd.DataFrame()
-        vif_df["variable"] = ["performance_composite_score", pos_score]
-        vif_df["VIF"] = [variance_inflation_factor(X_std, i) for i in range(X_std.shape[1])]
-        
+    columns = ["performance_composite_score", pos_score]
+    gram = Gram(df, columns)
+
+    if gram.n > 0:
+        # VIF計算（相関行列の逆行列の対角成分）
+        vif_df = vif(gram, columns).reset_index()
+
         print(f"\n{pos_score}:")
         print(vif_df)
     else:
-        print(f"\n{pos_score}: No data available")
\ No newline at end of file
+        print(f"\n{pos_score}: No data available")
+
+# ========== lr.py の全説明変数（各スペック・各ポジショングループ） ==========
+design = load_design()
+specs = expand_grid(design, GRID)
+vif_results = run_vif(design, specs)
+
+worst = vif_results.loc[vif_results.groupby("spec", sort=False)["VIF"].idxmax()]
+print(f"\nLargest VIF per specification ({len(specs)} specifications):")
+print(worst[["target", "feature_set", "year", "position_group", "big5_only", "variable", "VIF", "n"]]
+      .to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+high = vif_results[vif_results["VIF"] > VIF_THRESHOLD]
+print(f"\n{len(high)} VIFs above {VIF_THRESHOLD}" + (":" if len(high) else "."))
+if len(high):
+    print(high[["spec", "variable", "VIF"]].to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+vif_results.to_csv("vif_results.csv", index=False)
+print("Saved VIFs to 'vif_results.csv'.")
@@ -0,0 +1,101 @@
+# As-of joins of dated events (valuations, transfers) onto panel periods
+#
+# A panel row stands for one period of a player: a calendar year or a
+# football season. Instead of grouping events by the calendar year of their
+# date and merging on (player_id, year) - which duplicates a row for every
+# extra transfer in the year - every row gets the latest event before a
+# reference date of its period (the period end, a transfer window close,
+# ...), looking back to the period start or over a fixed lookback. The join
+# is a sort plus a binary search per row (pd.merge_asof grouped by player):
+# O(n log n) and exactly one match per panel row.
+import numpy as np
+import pandas as pd
+
+# period definition -> month the period starts in. Periods are labelled with
+# the calendar year they start in ("season" 2019 = 2019-07-01 .. 2020-06-30).
+SEASONS = {
+    "calendar": 1,
+    "season": 7,  # Jul-Jun
+}
+
+
+def period_of(dates, season="calendar"):
+    """Period label (the year the period starts in) of each date."""
+    return dates.dt.year - (dates.dt.month < SEASONS[season]).astype(int)
+
+
+def period_start(periods, season="calendar"):
+    """First day of each period."""
+    periods = np.asarray(periods, dtype=np.int64)
+    return pd.to_datetime(pd.DataFrame({"year": periods, "month": SEASONS[season], "day": 1}))
+
+
+def reference_dates(periods, season="calendar", at="end"):
+    """
+    Reference date of each period as an exclusive bound (events strictly
+    before it count). at="end": the end of the period; at="MM-DD": the end of
+    that day at its first occurrence in the period, e.g. "08-31" for the
+    close of the summer transfer window.
+    """
+    periods = np.asarray(periods, dtype=np.int64)
+    if at == "end":
+        return period_start(periods + 1, season)
+    month, day = (int(part) for part in at.split("-"))
+    year = periods + (month < SEASONS[season])
+    return pd.to_datetime(pd.DataFrame({"year": year, "month": month, "day": day})) + pd.Timedelta(days=1)
+
+
+def asof_candidates(events, date_col, by="player_id", season="calendar", at="end"):
+    """
+    The rows of `events` that asof_join(..., season=season, at=at) can match:
+    per (by, period) the last event before the period's reference date and
+    the last event of the period (for rows of later periods). Candidates of
+    chunks can be concatenated and reduced again, so the events never have to
+    be in memory at once. Sorted by date; events on the same date keep their
+    order, so the later one wins.
+    """
+    events = events.dropna(subset=[date_col]).sort_values(date_col, kind="stable")
+    period = period_of(events[date_col], season).to_numpy()
+    keys = pd.DataFrame({by: events[by].to_numpy(), "period": period})
+
+    last_of_period = ~keys.duplicated(keep="last").to_numpy()
+    before = (events[date_col] < reference_dates(period, season, at).to_numpy()).to_numpy()
+    last_before = np.zeros(len(events), dtype=bool)
+    last_before[np.flatnonzero(before)[~keys[before].duplicated(keep="last").to_numpy()]] = True
+    return events[last_of_period | last_before]
+
+
+def asof_join(left, right, date_col, values, by="player_id", period_col="year", season="calendar",
+              at="end", lookback=None, bounds=None):
+    """
+    Values of the latest `right` event before each `left` row's reference date.
+
+    left has `by` and `period_col` (the period label of the row), right has
+    `by`, `date_col` and the `values` columns. lookback=None only matches
+    events since the start of the row's period; a pd.Timedelta matches events
+    within that distance of the reference date instead (e.g. carrying the
+    last valuation over into a period without one). bounds=(start, end)
+    gives each row's period explicitly instead (e.g. half seasons); `end`
+    is then the reference date. Returns a DataFrame of `values` aligned with
+    left (NaN where nothing matches).
+    """
+    if bounds is None:
+        periods = left[period_col].to_numpy()
+        start, reference = period_start(periods, season), reference_dates(periods, season, at)
+    else:
+        start, reference = (pd.Series(np.asarray(b, dtype="datetime64[ns]")) for b in bounds)
+    rows = pd.DataFrame({
+        "row": np.arange(len(left)),
+        by: left[by].to_numpy(dtype=np.int64),
+        "reference": reference.to_numpy(),
+    }).sort_values("reference", kind="stable")
+    events = right[[by, date_col] + list(values)].dropna(subset=[date_col])
+    events = events.astype({by: np.int64}).sort_values(date_col, kind="stable")
+
+    matched = pd.merge_asof(rows, events, left_on="reference", right_on=date_col, by=by,
+                            direction="backward", allow_exact_matches=False, tolerance=lookback)
+    matched = matched.sort_values("row").reset_index(drop=True)
+    if lookback is None:
+        outside = (matched[date_col] < start).to_numpy()
+        matched.loc[outside, list(values)] = np.nan
+    return matched[list(values)].set_axis(left.index)
@@ -0,0 +1,69 @@
+# Micro-benchmark: row-wise apply vs. vectorized age / country_group / keyword_flags on synthetic data
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import TOP10_COUNTRIES, add_age, country_group, keyword_flags
+
+N_ROWS = 1_000_000
+
+
+def make_synthetic_panel(n_rows=N_ROWS, seed=0):
+    rng = np.random.default_rng(seed)
+    countries = np.array(TOP10_COUNTRIES + ["Japan", "Belgium", "Norway", "Ghana", "Mexico"], dtype=object)
+    dob = pd.to_datetime("1975-01-01") + pd.to_timedelta(rng.integers(0, 365 * 30, n_rows), unit="D")
+    panel_df = pd.DataFrame({
+        "year": rng.integers(2005, 2025, n_rows),
+        "date_of_birth": dob,
+        "country_of_citizenship": countries[rng.integers(0, len(countries), n_rows)],
+    })
+    # a few players without birth date / nationality, as in players.csv
+    missing = rng.random(n_rows) < 0.02
+    panel_df.loc[missing, "date_of_birth"] = pd.NaT
+    panel_df.loc[missing, "country_of_citizenship"] = np.nan
+    return panel_df
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<12} {elapsed:8.3f} s")
+    return result, elapsed
+
+
+panel_df = make_synthetic_panel()
+print(f"Synthetic panel: {len(panel_df):,} rows")
+
+print("\nage:")
+age_apply, t_apply = timed("apply", lambda: panel_df.apply(
+    lambda row: row["year"] - row["date_of_birth"].year if pd.notnull(row["date_of_birth"]) else None,
+    axis=1
+))
+age_vec, t_vec = timed("vectorized", lambda: add_age(panel_df.copy())["age"])
+assert np.allclose(age_apply.astype(float), age_vec.astype(float), equal_nan=True)
+print(f"  speedup: {t_apply / t_vec:.0f}x")
+
+print("\ncountry_group:")
+group_apply, t_apply = timed("apply", lambda: panel_df["country_of_citizenship"].apply(
+    lambda x: "Top10" if x in TOP10_COUNTRIES else "Other"
+))
+group_vec, t_vec = timed("vectorized", lambda: country_group(panel_df["country_of_citizenship"]))
+assert (group_apply == group_vec).all()
+print(f"  speedup: {t_apply / t_vec:.0f}x")
+
+print("\nkeyword_flags:")
+rng = np.random.default_rng(1)
+# overlapping ("goal kick" / "kick off"), nested ("save" / "saves") and non-ASCII case folding
+# ("İ".lower() is two characters, "ẞ" and "Σ" fold to other letters)
+words = np.array(["goal", "kick", "off", "saves", "SAVE", "Tackle", "İnterception", "ẞlock", "ΣAVE", "the", ""],
+                 dtype=object)
+descriptions = pd.Series([" ".join(rng.choice(words, rng.integers(0, 6))) for _ in range(100_000)] + [None])
+keywords = ["goal kick", "kick off", "kick", "save", "saves", "off", "tackle", "interception", "block", "σave"]
+flags_loop, t_apply = timed("loop", lambda: pd.DataFrame(
+    {f"{k}s": descriptions.str.lower().fillna("").str.contains(k, regex=False).astype(int) for k in keywords}
+))
+flags_vec, t_vec = timed("vectorized", lambda: keyword_flags(descriptions, keywords))
+assert (flags_loop.to_numpy() == flags_vec.to_numpy()).all()
+print(f"  speedup: {t_apply / t_vec:.1f}x")
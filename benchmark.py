@@ -0,0 +1,162 @@
+# Benchmark of the pipeline stages on synthetic data
+#
+#   python benchmark.py                      # scale 1, every stage
+#   python benchmark.py --scale 1 10 100     # several data sizes
+#   python benchmark.py --stages panel pca --repeat 3
+#
+# For every scale the synthetic source tables (synthetic_data.py) are written
+# once into .cache/bench/scale_<N>. The stages of pipeline.py then run there
+# one after another in dependency order, each in its own process. The wall
+# time and peak resident memory of every stage are appended to
+# .cache/bench/benchmark_results.csv together with the commit, so runs can be compared
+# over time. The first repeat starts from an empty cache (cold); later
+# repeats reuse the columnar/design caches (warm).
+#
+# Peak memory is the child's ru_maxrss. On Linux that includes the size of
+# the parent at fork time, so this script stays small: it does not import
+# numpy/pandas and generates the data in a child process as well.
+import argparse
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from pipeline import ROOT, STAGES, dependencies
+
+BENCH_DIR = os.path.join(".cache", "bench")
+RESULTS_FILE = os.path.join(BENCH_DIR, "benchmark_results.csv")
+FIELDS = ["timestamp", "commit", "scale", "seed", "stage", "run", "seconds", "peak_rss_mb", "status"]
+
+
+def stage_order(names=None):
+    """`names` (default: all stages) plus the stages they depend on, in dependency order."""
+    deps = dependencies()
+    order, done = [], set()
+
+    def visit(name):
+        if name not in done:
+            for d in deps[name]:
+                visit(d)
+            done.add(name)
+            order.append(name)
+
+    for name in names or STAGES:
+        visit(name)
+    return order
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def prepare_data(scale, seed, bench_dir=BENCH_DIR):
+    """Directory with the synthetic sources for (scale, seed); generated on first use."""
+    work_dir = os.path.join(bench_dir, f"scale_{scale:g}_seed_{seed}")
+    marker = os.path.join(work_dir, ".generated")
+    if not os.path.exists(marker):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, "synthetic_data.py"), work_dir,
+                        "--scale", str(scale), "--seed", str(seed)], check=True)
+        open(marker, "w").close()
+        print(f"generated scale {scale:g} in {time.perf_counter() - start:.1f}s")
+    os.makedirs(os.path.join(work_dir, "pca_outputs_by_position"), exist_ok=True)
+    return work_dir
+
+
+def run_stage(name, work_dir):
+    """Run one stage in work_dir; returns (seconds, peak RSS in MB or None, return code)."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    env["MPLBACKEND"] = "Agg"
+    with open(os.path.join(work_dir, f"{name}.log"), "w") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(ROOT, STAGES[name]["script"])],
+                                cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is in KiB on Linux, bytes on macOS
+            peak = usage.ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+        else:
+            proc.wait()
+            peak = None
+        return time.perf_counter() - start, peak, proc.returncode
+
+
+def _previous(results_file):
+    """Latest earlier measurement per (scale, seed, stage, run)."""
+    previous = {}
+    if os.path.exists(results_file):
+        with open(results_file, newline="") as f:
+            for row in csv.DictReader(f):
+                if row["status"] == "ok":
+                    previous[(row["scale"], row["seed"], row["stage"], row["run"])] = float(row["seconds"])
+    return previous
+
+
+def benchmark(scales=(1,), stages=None, repeat=1, seed=0, results_file=RESULTS_FILE, bench_dir=BENCH_DIR):
+    """Run the benchmark and append the measurements to results_file; returns them as a list of dicts."""
+    previous = _previous(results_file)
+    commit = _commit()
+    timestamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    rows = []
+    for scale in scales:
+        work_dir = prepare_data(scale, seed, bench_dir)
+        # upstream stages of the selection whose outputs are missing run once, unmeasured
+        for name in stage_order(stages):
+            if stages and name not in stages and not all(
+                    os.path.exists(os.path.join(work_dir, out)) for out in STAGES[name]["outputs"]):
+                print(f"scale {scale:g} preparing {name}")
+                run_stage(name, work_dir)
+        for run in range(1, repeat + 1):
+            if run == 1:
+                shutil.rmtree(os.path.join(work_dir, ".cache"), ignore_errors=True)  # cold start
+            for name in stage_order(stages):
+                if stages and name not in stages:
+                    continue
+                seconds, peak, returncode = run_stage(name, work_dir)
+                row = {
+                    "timestamp": timestamp, "commit": commit, "scale": f"{scale:g}", "seed": seed,
+                    "stage": name, "run": run, "seconds": round(seconds, 3),
+                    "peak_rss_mb": None if peak is None else round(peak, 1),
+                    "status": "ok" if returncode == 0 else "failed",
+                }
+                rows.append(row)
+                before = previous.get((row["scale"], str(seed), name, str(run)))
+                change = f"  ({seconds / before:.2f}x previous)" if before and returncode == 0 else ""
+                memory = "" if peak is None else f"{peak:8.0f} MB"
+                print(f"scale {scale:g} run {run} {name:<20} {seconds:8.2f}s {memory} {row['status']}{change}")
+                if returncode != 0:
+                    print(f"  see {os.path.join(work_dir, name + '.log')}")
+
+    os.makedirs(os.path.dirname(results_file) or ".", exist_ok=True)
+    new_file = not os.path.exists(results_file)
+    with open(results_file, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory-profile the pipeline stages on synthetic data.")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1], help="data sizes (multiples of synthetic_data.BASE_PLAYERS)")
+    parser.add_argument("--stages", nargs="*", default=None, help=f"stages to run (default: all of {', '.join(STAGES)})")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scale (the first one starts with empty caches)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=RESULTS_FILE, help="CSV the measurements are appended to")
+    args = parser.parse_args()
+
+    unknown = [s for s in args.stages or [] if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    rows = benchmark(args.scale, args.stages, args.repeat, args.seed, args.results)
+    sys.exit(1 if any(r["status"] != "ok" for r in rows) else 0)
@@ -0,0 +1,36 @@
+# Regression check: vectorized dominant_club() vs. the original per-group mode() lambda
+import numpy as np
+import pandas as pd
+
+from features import dominant_club
+
+
+def club_mode_lambda(df_app):
+    # original implementation from create_panel_df.py
+    club_mode = df_app.groupby(["player_id", "year"])["player_club_id"].agg(
+        lambda x: x.mode().iloc[0] if not x.mode().empty else x.iloc[0]
+    ).reset_index()
+    return club_mode.rename(columns={"player_club_id": "club_id"})
+
+
+def make_synthetic_appearances(n_rows=200_000, n_players=5_000, seed=0):
+    rng = np.random.default_rng(seed)
+    player_id = rng.integers(1, n_players + 1, n_rows)
+    year = rng.integers(2012, 2025, n_rows)
+    # few clubs per player so that ties between clubs are common
+    player_club_id = player_id * 10 + rng.integers(0, 3, n_rows)
+    return pd.DataFrame({"player_id": player_id, "year": year, "player_club_id": player_club_id})
+
+
+df_app = make_synthetic_appearances()
+expected = club_mode_lambda(df_app)
+result = dominant_club(df_app)
+pd.testing.assert_frame_equal(result, expected)
+print(f"dominant_club matches the mode() lambda on {len(expected)} player-years.")
+
+# Missing club ids: groups where every club is NaN must come back as NaN
+df_nan = df_app.astype({"player_club_id": float})
+df_nan.loc[df_nan.sample(frac=0.3, random_state=0).index, "player_club_id"] = np.nan
+df_nan.loc[df_nan["player_id"] == 1, "player_club_id"] = np.nan
+pd.testing.assert_frame_equal(dominant_club(df_nan), club_mode_lambda(df_nan))
+print("dominant_club matches the mode() lambda with missing club ids.")
@@ -1,18 +1,17 @@
-import pandas as pd
-import numpy as np
+from panel_store import open_store
 
-# データの読み込み
-panel_pca = pd.read_csv("panel_with_all_pca.csv")
+# データの読み込み（インデックス付きパネルストア、CSVの全読み込みなし）
+panel_pca = open_store("panel_with_all_pca")
 
 # 利用可能な列を確認
 print("Available columns:")
-print(panel_pca.columns.tolist())
+print(panel_pca.columns)
 
 # ポジション分布を確認
 print("\nPosition distribution:")
-print(panel_pca['position'].value_counts())
+print(panel_pca.position_counts())
 
 # PCスコアの列を確認
 pc_cols = [col for col in panel_pca.columns if 'PC' in col or 'performance_score' in col]
 print("\nPC score columns:")
-print(pc_cols)
\ No newline at end of file
+print(pc_cols)
@@ -0,0 +1,220 @@
+# Match-day cubes of the player statistics and roll-ups to any time bucketing
+#
+# The panel used to be aggregated straight to calendar years (date.dt.year),
+# so every other bucketing meant rescanning appearances, game_lineups and
+# game_events. build_cubes() scans them once into cubes at (player_id, match
+# day) granularity - the panel_builder partial aggregates with the date as
+# key - and load_cubes() keeps them under .cache/cubes. From there:
+#
+#   roll_up(cubes, "season")            # calendar / season / half_season
+#   build_bucketed_panel("season")      # the full panel per football season
+#   rolling(cubes, days=365)            # trailing windows at any anchor dates
+#
+# Seasons are asof.SEASONS["season"] (Jul-Jun, labelled by the year they
+# start in); half seasons split them into Jul-Dec (half 1) and Jan-Jun (half 2).
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from asof import SEASONS, period_of, period_start
+from data_cache import CACHE_DIR, load_table, read_frame, write_frame, write_json
+from design_matrix import modules_key, sources_state
+from features import DEFENSIVE_KEYWORDS
+from panel_builder import (
+    APPEARANCE_FOLD,
+    TRANSFER_COLUMNS,
+    VALUATION_COLUMNS,
+    appearance_stats,
+    assemble_panel,
+    fold_appearances,
+    fold_defense,
+    fold_lineups,
+    starts_and_subs,
+)
+
+CUBE_KEYS = ["player_id", "date"]
+CUBE_SOURCES = ["appearances.csv", "game_lineups.csv", "game_events.csv"]
+# Modules whose code builds the cubes (part of the cache key)
+CUBE_MODULES = ["cubes.py", "panel_builder.py", "features.py", "data_cache.py"]
+
+# bucketing -> period key columns (besides player_id)
+BUCKETINGS = {
+    "calendar": ["year"],
+    "season": ["year"],
+    "half_season": ["year", "half"],
+}
+
+# Appearance columns summed by rolling() (plus starts / subs and the defensive action counts)
+ROLLING_STATS = ["minutes_played", "goals", "assists", "yellow_cards", "red_cards", "appearances"]
+
+
+# ==============Cubes==============
+def build_cubes(chunksize=None, data_dir=".", keywords=DEFENSIVE_KEYWORDS):
+    """
+    Per-(player_id, date) partial aggregates of the match tables:
+    {"appearances": stats, "clubs": club counts (+ player_club_id level),
+    "lineups": lineup counts (+ type level), "defense": defensive action counts}.
+    """
+    stats, clubs = fold_appearances(chunksize, data_dir, keys=CUBE_KEYS)
+    return {
+        "appearances": stats,
+        "clubs": clubs,
+        "lineups": fold_lineups(chunksize, data_dir, keys=CUBE_KEYS),
+        "defense": fold_defense(chunksize, data_dir, keywords, keys=CUBE_KEYS),
+    }
+
+
+def _cube_state(data_dir, keywords):
+    return {"sources": sources_state([os.path.join(data_dir, s) for s in CUBE_SOURCES]),
+            "keywords": list(keywords), "key": modules_key(CUBE_MODULES)}
+
+
+def load_cubes(chunksize=None, data_dir=".", keywords=DEFENSIVE_KEYWORDS):
+    """build_cubes(), cached under .cache/cubes until the match tables or the building code change."""
+    cube_dir = os.path.join(data_dir, CACHE_DIR, "cubes")
+    meta_path = os.path.join(cube_dir, "cubes.json")
+    state = _cube_state(data_dir, keywords)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["state"] == state:
+            cubes = {}
+            for name, entry in meta["cubes"].items():
+                cube = read_frame(os.path.join(cube_dir, entry["file"])).set_index(entry["index"])
+                cubes[name] = cube["n"] if entry["series"] else cube
+            return cubes
+    except (OSError, ValueError, KeyError):
+        pass
+
+    cubes = build_cubes(chunksize, data_dir, keywords)
+    os.makedirs(cube_dir, exist_ok=True)
+    entries = {}
+    for name, cube in cubes.items():
+        series = isinstance(cube, pd.Series)
+        frame = cube.to_frame("n") if series else cube
+        entries[name] = {"file": write_frame(frame.reset_index(), cube_dir, name),
+                         "index": list(cube.index.names), "series": series}
+    write_json(meta_path, {"state": state, "cubes": entries}, indent=1)
+    return cubes
+
+
+# ==============Bucketing==============
+def bucket(dates, bucketing="calendar"):
+    """Period keys (BUCKETINGS[bucketing] columns) of each date."""
+    dates = pd.Series(dates)
+    if bucketing == "calendar":
+        keys = {"year": dates.dt.year.to_numpy()}
+    else:
+        keys = {"year": period_of(dates, "season").to_numpy()}
+    if bucketing == "half_season":
+        keys["half"] = np.where(dates.dt.month >= SEASONS["season"], 1, 2)
+    return pd.DataFrame(keys)
+
+
+def bucket_bounds(periods, bucketing="calendar"):
+    """(start, end) dates of the periods (a frame with the BUCKETINGS[bucketing] columns); end is exclusive."""
+    year = periods["year"].to_numpy(dtype=np.int64)
+    if bucketing != "half_season":
+        season = "calendar" if bucketing == "calendar" else "season"
+        return period_start(year, season), period_start(year + 1, season)
+    second = periods["half"].to_numpy() == 2
+    first_half = period_start(year, "season")
+    second_half = period_start(year + 1, "calendar")
+    start = first_half.where(~second, second_half)
+    end = second_half.where(~second, period_start(year + 1, "season"))
+    return start, end
+
+
+def _regroup(cube, bucketing, how):
+    """Sum (or fold with `how`) a cube over the periods of its dates, keeping its other index levels."""
+    index = cube.index.to_frame(index=False)
+    keys = bucket(index["date"], bucketing)
+    levels = [index["player_id"]] + [keys[c].rename(c) for c in keys]
+    levels += [index[c] for c in index.columns if c not in CUBE_KEYS]
+    grouped = cube.groupby([level.to_numpy() for level in levels])
+    rolled = grouped.agg(how) if how is not None else grouped.sum()
+    rolled.index.names = [level.name for level in levels]
+    return rolled
+
+
+def roll_up(cubes, bucketing="calendar"):
+    """The cubes summed per (player_id, period keys): same layout as build_cubes(), dates replaced by periods."""
+    return {
+        "appearances": _regroup(cubes["appearances"], bucketing, APPEARANCE_FOLD),
+        "clubs": _regroup(cubes["clubs"], bucketing, None),
+        "lineups": _regroup(cubes["lineups"], bucketing, None),
+        "defense": _regroup(cubes["defense"], bucketing, None),
+    }
+
+
+def build_bucketed_panel(bucketing="season", chunksize=None, data_dir=".", keywords=DEFENSIVE_KEYWORDS, cubes=None,
+                         valuation_at="end", transfer_at="end", lookback=None):
+    """
+    The panel (like panel_builder.build_panel_df) with one row per player and
+    period of `bucketing`, from the cached cubes. Market value and transfer
+    fee are the last ones before the reference date valuation_at /
+    transfer_at ("end" or "MM-DD") of each period, since its start or within
+    `lookback`. Half seasons only support "end".
+    """
+    if bucketing not in BUCKETINGS:
+        raise ValueError(f"Unknown bucketing {bucketing!r}; expected one of {sorted(BUCKETINGS)}")
+    if bucketing == "half_season" and (valuation_at, transfer_at) != ("end", "end"):
+        raise ValueError("Half seasons take valuations and transfers as of the period end only")
+    if cubes is None:
+        cubes = load_cubes(chunksize, data_dir, keywords)
+    rolled = roll_up(cubes, bucketing)
+    player_periods = appearance_stats(rolled["appearances"], rolled["clubs"])
+    if bucketing == "half_season":
+        periods = {"bounds": bucket_bounds(player_periods, bucketing)}
+    else:
+        periods = {"season": bucketing}
+    return assemble_panel(
+        player_periods,
+        load_table("player_valuations", columns=VALUATION_COLUMNS, data_dir=data_dir),
+        load_table("transfers", columns=TRANSFER_COLUMNS, data_dir=data_dir),
+        starts_and_subs(rolled["lineups"]),
+        rolled["defense"].reset_index(),
+        data_dir, keys=["player_id"] + BUCKETINGS[bucketing],
+        valuation_at=valuation_at, transfer_at=transfer_at, lookback=lookback, **periods,
+    )
+
+
+# ==============Rolling windows==============
+def _daily_totals(cubes):
+    """One row per (player_id, date) with the summable columns of all cubes, sorted."""
+    appearances = cubes["appearances"].rename(columns={"game_id": "appearances"})
+    lineups = starts_and_subs(cubes["lineups"]).set_index(CUBE_KEYS)[["starts", "subs"]]
+    parts = [appearances[ROLLING_STATS], lineups, cubes["defense"]]
+    daily = pd.concat(parts, axis=1).fillna(0).astype(np.int64)
+    return daily.sort_index()
+
+
+def rolling(cubes, days=365, anchors=None):
+    """
+    Trailing sums over the `days` days up to and including each anchor date:
+    anchors is a frame with player_id and date (default: every match day of
+    every player). Each window is two binary searches into per-player
+    cumulative sums, so the cost does not depend on the window length.
+    """
+    daily = _daily_totals(cubes)
+    if anchors is None:
+        anchors = daily.index.to_frame(index=False)
+    player = daily.index.get_level_values("player_id").to_numpy(dtype=np.int64)
+    day = daily.index.get_level_values("date").to_numpy().astype("datetime64[D]").astype(np.int64)
+    span = 1 << 20  # days per player in the combined sort key (more than any date range)
+    key = player * span + day
+    totals = np.vstack([np.zeros((1, daily.shape[1]), dtype=np.int64), np.cumsum(daily.to_numpy(), axis=0)])
+
+    anchor_key = (anchors["player_id"].to_numpy(dtype=np.int64) * span
+                  + pd.to_datetime(anchors["date"]).to_numpy().astype("datetime64[D]").astype(np.int64))
+    hi = np.searchsorted(key, anchor_key, "right")
+    lo = np.searchsorted(key, anchor_key - days, "right")
+    sums = pd.DataFrame(totals[hi] - totals[lo], columns=daily.columns)
+
+    out = pd.concat([anchors[["player_id", "date"]].reset_index(drop=True), sums], axis=1)
+    minutes = out["minutes_played"].replace(0, np.nan)
+    out["goals_per_90"] = out["goals"] / minutes * 90
+    out["assists_per_90"] = out["assists"] / minutes * 90
+    return out
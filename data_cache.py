@@ -0,0 +1,277 @@
+# Columnar cache for the Transfermarkt CSVs
+#
+# Every stage used to call pd.read_csv + pd.to_datetime on the raw dumps.
+# load_table() converts a CSV once into a typed columnar file under .cache/
+# (Parquet when pyarrow is available, pickle otherwise) and reuses it until
+# the source CSV changes.
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = ".cache"
+
+# Bump when the conversion logic changes so that old caches are rebuilt
+CACHE_VERSION = 3
+
+# ==============Typed schemas for the source tables and the panel==============
+# dates:       parsed to datetime64 (errors raise, like the original scripts)
+# coerce_dates: parsed with errors="coerce"
+# categories:  low-cardinality strings stored as pandas categoricals
+# ids:         integer keys downcast to int32 when they have no missing values
+# counts:      integer columns downcast to the smallest integer type holding their values
+#
+# The player-year panel written by the pipeline uses PANEL_SCHEMA (see
+# panel_memory.py for its effect on the memory footprint)
+PANEL_SCHEMA = {
+    "coerce_dates": ["date_of_birth"],
+    "categories": ["player_name", "name", "position", "foot", "country_of_citizenship"],
+    "ids": ["player_id", "club_id"],
+    "counts": ["year", "minutes_played", "goals", "assists", "yellow_cards", "red_cards",
+               "appearances", "starts", "subs"],
+}
+PANEL_TABLES = ["panel_df", "panel_df_cleaned", "panel_with_pca", "panel_with_all_pca"]
+
+SCHEMAS = {
+    "appearances": {
+        "dates": ["date"],
+        "ids": ["appearance_id", "game_id", "player_id", "player_club_id", "player_current_club_id"],
+    },
+    "game_events": {
+        "dates": ["date"],
+        "ids": ["game_id", "club_id", "player_id", "player_in_id", "player_assist_id"],
+    },
+    "game_lineups": {
+        "dates": ["date"],
+        "ids": ["game_id", "player_id", "club_id"],
+    },
+    "player_valuations": {
+        "dates": ["date"],
+        "ids": ["player_id", "current_club_id"],
+    },
+    "transfers": {
+        "dates": ["transfer_date"],
+        "ids": ["player_id", "from_club_id", "to_club_id"],
+    },
+    "players": {
+        "coerce_dates": ["date_of_birth", "contract_expiration_date"],
+        "categories": ["position", "sub_position", "foot", "country_of_citizenship"],
+        "ids": ["player_id", "current_club_id"],
+    },
+    "clubs": {
+        "ids": ["club_id"],
+    },
+    **{name: PANEL_SCHEMA for name in PANEL_TABLES},
+}
+
+
+def _file_sha256(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _has_parquet():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def apply_schema(df, schema):
+    """Convert the columns of a freshly read CSV frame to their typed representation."""
+    for col in schema.get("dates", []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    for col in schema.get("coerce_dates", []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    for col in schema.get("categories", []):
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in schema.get("ids", []):
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+            info = np.iinfo(np.int32)
+            if df[col].empty or (df[col].min() >= info.min and df[col].max() <= info.max):
+                df[col] = df[col].astype(np.int32)
+    for col in schema.get("counts", []):
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+    return df
+
+
+def _paths(name, data_dir):
+    csv_path = os.path.join(data_dir, f"{name}.csv")
+    cache_dir = os.path.join(data_dir, CACHE_DIR)
+    return csv_path, os.path.join(cache_dir, f"{name}.meta.json"), cache_dir
+
+
+def _source_state(csv_path, schema):
+    stat = os.stat(csv_path)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "version": CACHE_VERSION,
+        "schema": json.dumps(schema, sort_keys=True),
+    }
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    A unique temporary path next to `path` (same extension) that is moved
+    over `path` when the block succeeds. Pipeline stages run concurrently and
+    share .cache: readers (and memory maps) keep seeing the previous complete
+    file while another process writes a new one.
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=f".tmp{os.path.splitext(name)[1]}",
+                                    dir=directory or ".")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_json(path, data, indent=2):
+    with atomic_path(path) as tmp_path, open(tmp_path, "w") as f:
+        json.dump(data, f, indent=indent)
+
+
+def _write_meta(meta_path, meta):
+    write_json(meta_path, meta)
+
+
+def _is_valid(meta, state, csv_path, cache_dir, meta_path):
+    """Check a cache entry against the source CSV (mtime first, content hash as fallback)."""
+    if meta is None or not os.path.exists(os.path.join(cache_dir, meta.get("file", ""))):
+        return False
+    if meta["version"] != state["version"] or meta["schema"] != state["schema"]:
+        return False
+    if meta["size"] == state["size"] and meta["mtime_ns"] == state["mtime_ns"]:
+        return True
+    # Touched but possibly unchanged (e.g. re-checkout): compare content hashes
+    if meta["size"] != state["size"] or meta["sha256"] != _file_sha256(csv_path):
+        return False
+    meta["mtime_ns"] = state["mtime_ns"]
+    _write_meta(meta_path, meta)
+    return True
+
+
+def write_frame(df, cache_dir, name):
+    """Store df as <cache_dir>/<name>.parquet (or .pkl as fallback) and return the file name."""
+    if _has_parquet():
+        fname = f"{name}.parquet"
+        try:
+            with atomic_path(os.path.join(cache_dir, fname)) as tmp_path:
+                df.to_parquet(tmp_path, index=False)
+            return fname
+        except (TypeError, ValueError, ImportError):
+            # e.g. object columns with mixed types that Arrow cannot represent
+            pass
+    fname = f"{name}.pkl"
+    with atomic_path(os.path.join(cache_dir, fname)) as tmp_path:
+        df.to_pickle(tmp_path)
+    return fname
+
+
+def read_frame(path, columns=None):
+    """Read a file written by write_frame()."""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    df = pd.read_pickle(path)
+    return df[columns] if columns is not None else df
+
+
+def _valid_cache_file(name, data_dir, schema):
+    """Path of the cached file for <name> if it is up to date, else None."""
+    csv_path, meta_path, cache_dir = _paths(name, data_dir)
+    meta = _read_meta(meta_path)
+    if _is_valid(meta, _source_state(csv_path, schema), csv_path, cache_dir, meta_path):
+        return os.path.join(cache_dir, meta["file"])
+    return None
+
+
+def load_table(name, columns=None, data_dir=".", schema=None):
+    """
+    Load <data_dir>/<name>.csv through the columnar cache.
+
+    The first call parses the CSV, applies the typed schema (SCHEMAS[name] by
+    default) and stores the result in <data_dir>/.cache. Later calls read the
+    cached file directly as long as the CSV's size/mtime or sha256 match.
+    """
+    csv_path, meta_path, cache_dir = _paths(name, data_dir)
+    if schema is None:
+        schema = SCHEMAS.get(name, {})
+
+    cache_file = _valid_cache_file(name, data_dir, schema)
+    if cache_file is not None:
+        return read_frame(cache_file, columns)
+
+    # round_trip: floats written by the pipeline itself (panel_df.csv, ...) read back exactly
+    df = apply_schema(pd.read_csv(csv_path, float_precision="round_trip"), schema)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    state = _source_state(csv_path, schema)
+    state["sha256"] = _file_sha256(csv_path)
+    state["file"] = write_frame(df, cache_dir, name)
+    _write_meta(meta_path, state)
+
+    return df[columns] if columns is not None else df
+
+
+def table_sha256(name, data_dir="."):
+    """sha256 of <data_dir>/<name>.csv (from its cache entry when that is up to date, hashed otherwise)."""
+    csv_path, meta_path, _ = _paths(name, data_dir)
+    meta = _read_meta(meta_path)
+    stat = os.stat(csv_path)
+    if meta is not None and meta.get("size") == stat.st_size and meta.get("mtime_ns") == stat.st_mtime_ns:
+        return meta["sha256"]
+    return _file_sha256(csv_path)
+
+
+def iter_table(name, chunksize=None, columns=None, data_dir=".", schema=None):
+    """
+    Yield <name> as typed DataFrame chunks of at most `chunksize` rows.
+
+    With chunksize=None the whole table is yielded once via load_table().
+    Otherwise the table is streamed from an up-to-date Parquet cache when
+    there is one, and from the CSV itself (without building a cache) when
+    there is not, so that tables larger than memory never have to be
+    loaded at once.
+    """
+    if schema is None:
+        schema = SCHEMAS.get(name, {})
+    if chunksize is None:
+        yield load_table(name, columns=columns, data_dir=data_dir, schema=schema)
+        return
+
+    cache_file = _valid_cache_file(name, data_dir, schema)
+    if cache_file is not None and cache_file.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(cache_file).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    csv_path = os.path.join(data_dir, f"{name}.csv")
+    for chunk in pd.read_csv(csv_path, usecols=columns, chunksize=chunksize, float_precision="round_trip"):
+        yield apply_schema(chunk, schema)
@@ -0,0 +1,165 @@
+# Encoded numeric design matrix shared by the regression code
+#
+# The regression design is encoded once into a column-major float matrix
+# with a column index, per-column "is finite" masks and the labels of
+# categorical columns (stored as codes). Single columns are zero-copy views,
+# masks for any column subset are ANDs of the cached masks, and the matrix
+# can be saved under .cache/design and memory-mapped by the next script
+# instead of being rebuilt from the CSVs.
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_cache import CACHE_DIR, atomic_path, write_json
+
+
+class DesignMatrix:
+    """
+    values: (rows, columns) float array, column-major so every column is contiguous
+    columns: column names; categories: {column: labels} for code-encoded columns
+    index: optional row index, a DataFrame of key columns (e.g. player_id, year)
+    """
+
+    def __init__(self, values, columns, categories=None, finite=None, index=None):
+        self.values = values
+        self.columns = list(columns)
+        self.position = {c: i for i, c in enumerate(self.columns)}
+        self.categories = dict(categories or {})
+        self.finite = np.isfinite(values) if finite is None else finite
+        self.index = index
+        self.path = None  # directory of a loaded design (its files can be reopened by other processes)
+
+    @classmethod
+    def from_frame(cls, frame, categorical=(), dtype=np.float64, index=()):
+        """
+        Encode the numeric/bool columns of frame, plus `categorical` columns as
+        codes (NaN: missing). `index` columns are kept as the row index instead.
+        """
+        categories = {}
+        columns = {}
+        for col in frame.columns:
+            if col in index:
+                continue
+            if col in categorical:
+                codes, labels = pd.factorize(frame[col], sort=True)
+                columns[col] = np.where(codes < 0, np.nan, codes)
+                categories[col] = [str(label) for label in labels]
+            elif pd.api.types.is_numeric_dtype(frame[col]) or pd.api.types.is_bool_dtype(frame[col]):
+                columns[col] = frame[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        values = np.empty((len(frame), len(columns)), dtype=dtype, order="F")
+        for i, col in enumerate(columns.values()):
+            values[:, i] = col
+        row_index = frame[list(index)].reset_index(drop=True) if len(index) else None
+        return cls(values, list(columns), categories, index=row_index)
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def __getitem__(self, key):
+        """design["col"]: zero-copy column view; design[["a", "b"]]: DataFrame (like pandas)."""
+        if isinstance(key, str):
+            return self.values[:, self.position[key]]
+        return pd.DataFrame({c: self.values[:, self.position[c]] for c in key})
+
+    def labels(self, column):
+        """Decoded labels of a categorical column (None where missing)."""
+        codes = self.values[:, self.position[column]]
+        labels = np.asarray(self.categories[column] + [None], dtype=object)
+        return labels[np.where(np.isnan(codes), -1, codes).astype(np.int64)]
+
+    def finite_mask(self, columns):
+        """Rows where all `columns` are finite (from the cached per-column masks)."""
+        mask = np.ones(len(self), dtype=bool)
+        for c in columns:
+            mask &= self.finite[:, self.position[c]]
+        return mask
+
+    def matrix(self, columns, mask=None):
+        """
+        float64 values of `columns` (on the rows of mask). A contiguous run of
+        columns without a mask is returned as a view, anything else is copied
+        once into a new array.
+        """
+        ix = [self.position[c] for c in columns]
+        if mask is None:
+            if ix == list(range(ix[0], ix[0] + len(ix))) and self.values.dtype == np.float64:
+                return self.values[:, ix[0]:ix[0] + len(ix)]
+            return np.asarray(self.values[:, ix], dtype=np.float64)
+        return np.asarray(self.values[np.ix_(np.flatnonzero(mask), ix)], dtype=np.float64)
+
+    # ==============Persistence==============
+    def save(self, path, meta=None):
+        """
+        Write values/finite masks (and the row index) as .npy files plus a JSON
+        sidecar with columns, categories and `meta`.
+        """
+        os.makedirs(path, exist_ok=True)
+        arrays = {"values.npy": np.asfortranarray(self.values), "finite.npy": np.asfortranarray(self.finite)}
+        if self.index is not None:
+            arrays["index.npy"] = self.index.to_records(index=False)
+        else:
+            try:
+                os.remove(os.path.join(path, "index.npy"))
+            except FileNotFoundError:
+                pass
+        for name, array in arrays.items():
+            # new files are moved into place, so processes mapping the old ones are unaffected
+            with atomic_path(os.path.join(path, name)) as tmp_path:
+                np.save(tmp_path, array)
+        sidecar = {"columns": self.columns, "categories": self.categories, "meta": meta or {}}
+        write_json(os.path.join(path, "design.json"), sidecar, indent=1)  # written last: marks the files as complete
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a saved design (memory-mapped, read-only, by default). Returns (design, meta)."""
+        with open(os.path.join(path, "design.json")) as f:
+            sidecar = json.load(f)
+        mode = "r" if mmap else None
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode=mode)
+        finite = np.load(os.path.join(path, "finite.npy"), mmap_mode=mode)
+        index_path = os.path.join(path, "index.npy")
+        index = pd.DataFrame(np.load(index_path)) if os.path.exists(index_path) else None
+        design = cls(values, sidecar["columns"], sidecar["categories"], finite, index)
+        design.path = path
+        return design, sidecar["meta"]
+
+
+def sources_state(paths):
+    """{file name: [size, mtime_ns]} of `paths`, to detect changed inputs of a cached file."""
+    state = {}
+    for p in paths:
+        stat = os.stat(p)
+        state[os.path.basename(p)] = [stat.st_size, stat.st_mtime_ns]
+    return state
+
+
+def modules_key(modules):
+    """sha256 of the source of `modules` (file names of this repo), to rebuild caches when the code building them changes."""
+    h = hashlib.sha256()
+    for module in modules:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def cached_design(name, build, sources, key="", data_dir=".", dtype=np.float64):
+    """
+    Design `name` from .cache/design/<name>, rebuilt with build() -> DesignMatrix
+    when any of the `sources` (file names in data_dir) or `key` (e.g. a hash
+    of the building code) changed since it was saved.
+    """
+    path = os.path.join(data_dir, CACHE_DIR, "design", name)
+    state = {"sources": sources_state([os.path.join(data_dir, s) for s in sources]),
+             "key": key, "dtype": np.dtype(dtype).str}
+    try:
+        design, meta = DesignMatrix.load(path)
+        if meta == state:
+            return design
+    except (OSError, ValueError, KeyError):
+        pass
+    design = build()
+    design.save(path, state)
+    return design
@@ -0,0 +1,94 @@
+# Vectorized feature derivations shared by the panel scripts
+import re
+
+import numpy as np
+import pandas as pd
+
+
+def club_counts(df, keys=("player_id", "year"), club_col="player_club_id"):
+    """Number of rows per (keys..., club); counts of separate chunks can simply be summed."""
+    return df.groupby(list(keys) + [club_col]).size()
+
+
+def dominant_club_from_counts(counts, groups, club_col="player_club_id"):
+    """
+    Pick the most frequent club per group from a club_counts() series.
+
+    `groups` is the index of all player-years that should appear in the result;
+    groups without any club get NaN.
+    """
+    keys = list(groups.names)
+    counts = counts.sort_index().reset_index(name="n")
+    # counts is sorted by club id within each group, so idxmax picks the smallest club on ties
+    top = counts.loc[counts.groupby(keys)["n"].idxmax()].set_index(keys)[club_col]
+
+    club_mode = top.reindex(groups).reset_index()
+    return club_mode.rename(columns={club_col: "club_id"})
+
+
+def dominant_club(df, keys=("player_id", "year"), club_col="player_club_id"):
+    """
+    Most frequent club per player-year (in case of mid-season transfer).
+
+    Same result as groupby(keys)[club_col].agg(lambda x: x.mode().iloc[0]),
+    i.e. ties go to the smallest club id and groups without any club get NaN,
+    but computed from one count table instead of a Python call per group.
+    """
+    # every player-year present in the data (NaN keys dropped, sorted like groupby)
+    groups = df.groupby(list(keys)).size().index
+    return dominant_club_from_counts(club_counts(df, keys, club_col), groups, club_col)
+
+
+def add_age(panel_df, year_col="year", dob_col="date_of_birth"):
+    """Age in the panel year (NaN when date_of_birth is missing)."""
+    panel_df["age"] = panel_df[year_col] - panel_df[dob_col].dt.year
+    return panel_df
+
+
+TOP10_COUNTRIES = ['France', 'Germany', 'Spain', 'Italy', 'Brazil', 'Argentina', 'England', 'Portugal', 'Netherlands', 'Croatia']
+
+
+def country_group(countries, top_countries=TOP10_COUNTRIES):
+    """Map country_of_citizenship to "Top10"/"Other" (missing countries are "Other")."""
+    return pd.Series(
+        np.where(countries.isin(top_countries), "Top10", "Other"),
+        index=countries.index,
+    )
+
+
+# Keywords counted from game_events descriptions (one column f"{keyword}s" each).
+# Adding e.g. "save" or "foul" here does not add another scan over the events.
+DEFENSIVE_KEYWORDS = ["tackle", "interception", "block", "clearance"]
+
+
+def keyword_flags(descriptions, keywords=DEFENSIVE_KEYWORDS):
+    """
+    0/1 flag per description and keyword, like
+    descriptions.str.lower().fillna("").str.contains(keyword).astype(int) for each keyword,
+    but with a single scan of the lowercased descriptions for all keywords at once.
+    """
+    # The lookahead matches at every position, so overlapping keywords (e.g.
+    # "goal kick" and "kick off" in "goal kick off") are all found. Longest
+    # keywords first so that e.g. "saves" wins over "save" at the same position;
+    # keywords contained in the matched one are credited through `contains` below.
+    ordered = sorted(dict.fromkeys(k.lower() for k in keywords), key=len, reverse=True)
+    pattern = "(?=(" + "|".join(re.escape(k) for k in ordered) + "))"
+
+    columns = [f"{k}s" for k in keywords]
+    contains = np.array([[k.lower() in m for k in keywords] for m in ordered])
+
+    # Event descriptions are highly repetitive, so only the distinct texts are scanned.
+    # They are lowercased first (like the loop), so every match is literally one of `ordered`;
+    # a case-insensitive scan would map e.g. "İ" (whose lowercase is two characters) to no keyword.
+    codes, uniques = pd.factorize(descriptions)
+    matches = pd.Series(uniques, dtype=object).str.lower().str.extractall(pattern)[0]
+
+    # one extra row for missing descriptions (code -1), which never match
+    unique_flags = np.zeros((len(uniques) + 1, len(keywords)), dtype=bool)
+    if len(matches):
+        rows = matches.index.get_level_values(0).to_numpy()
+        match_codes = pd.Categorical(matches, categories=ordered).codes
+        assert (match_codes >= 0).all(), "keyword match outside the keyword list"
+        np.logical_or.at(unique_flags, rows, contains[match_codes])
+
+    return pd.DataFrame(unique_flags[codes].astype(int), index=descriptions.index, columns=columns)
@@ -0,0 +1,146 @@
+# Fixed-effects (within) regression for the player-year panel
+#
+# The player, club and year effects are absorbed by demeaning y and X with
+# alternating projections (subtract the group means of one factor after the
+# other until nothing changes), so no dummy columns are ever built: memory is
+# O(rows x regressors) however many players and clubs there are. Standard
+# errors are clustered (by player by default).
+import numpy as np
+import pandas as pd
+
+ABSORB = ["player_id", "club_id", "year"]
+
+# Alternating projections stop once a sweep changes no value by more than TOL (relative to the column scale)
+TOL = 1e-10
+MAX_ITER = 10_000
+
+
+def _group_sums(V, codes, n_groups):
+    """Group sums of every column of V at once (one bincount over code + group offset per column)."""
+    k = V.shape[1]
+    flat = (codes[:, None] + n_groups * np.arange(k)).ravel()
+    return np.bincount(flat, weights=V.ravel(), minlength=n_groups * k).reshape(k, n_groups).T
+
+
+def _group_means(V, codes, n_groups):
+    return _group_sums(V, codes, n_groups) / np.bincount(codes, minlength=n_groups)[:, None]
+
+
+def _sweep(V, factors):
+    """One round of alternating projections: subtract the group means of every factor in turn."""
+    V = V.copy()
+    for codes, n_groups in factors:
+        V -= _group_means(V, codes, n_groups)[codes]
+    return V
+
+
+def demean(V, factors, tol=TOL, max_iter=MAX_ITER):
+    """
+    Project the columns of V off the dummies of all factors (list of
+    (codes, n_groups)). Returns (demeaned copy, number of sweeps).
+
+    Two sweeps at a time are combined with Irons-Tuck extrapolation, which
+    cuts the number of sweeps by an order of magnitude when players move
+    between few clubs (the slowly converging case).
+    """
+    V = np.array(V, dtype=np.float64)
+    if len(factors) == 1:
+        return _sweep(V, factors), 1
+    scale = np.maximum(np.abs(V).max(axis=0), 1.0)
+    for iteration in range(1, max_iter // 2 + 1):
+        F1 = _sweep(V, factors)
+        F2 = _sweep(F1, factors)
+        step = F2 - F1
+        if (np.abs(step).max(axis=0) / scale).max() < tol:
+            return F2, 2 * iteration
+        second = step - (F1 - V)
+        denom = (second * second).sum(axis=0)
+        ratio = np.divide((step * second).sum(axis=0), denom, out=np.zeros_like(denom), where=denom > 0)
+        V = F2 - ratio * step
+    raise RuntimeError(f"alternating projections did not converge in {max_iter} sweeps")
+
+
+def _drop_singletons(frame, absorb):
+    """Rows to keep after dropping singleton groups of any factor (repeated until none are left)."""
+    codes = [pd.factorize(frame[col])[0] for col in absorb]
+    keep = np.ones(len(frame), dtype=bool)
+    while True:
+        single = np.zeros(len(frame), dtype=bool)
+        for c in codes:
+            single |= keep & (np.bincount(c[keep], minlength=c.max() + 1)[c] == 1)
+        if not single.any():
+            return keep
+        keep &= ~single
+
+
+def fit_fixed_effects(data, target, features, absorb=ABSORB, cluster="player_id", rows=None):
+    """
+    Within regression of target on features absorbing the fixed effects of the
+    `absorb` columns, with standard errors clustered by `cluster`.
+
+    Rows with a missing value, and singleton groups (rows that are alone in
+    their player/club/year; they carry no within variation), are dropped. Regressors
+    that do not vary within the absorbed groups (e.g. height with player
+    effects, age with player and year effects) are dropped and listed under
+    "absorbed". Returns a dict like ols.Gram.solve(): the coefficient table
+    (coef, std_err, t, p_value, std_coef), within R², n, number of clusters
+    and the number of projection sweeps.
+    """
+    from scipy import stats
+
+    columns = list(features) + [target]
+    groups = list(dict.fromkeys(list(absorb) + [cluster]))
+    frame = data[groups]
+    values = data[columns].to_numpy(dtype=np.float64)
+    mask = np.isfinite(values).all(axis=1) & frame.notna().all(axis=1).to_numpy()
+    if rows is not None:
+        mask &= np.asarray(rows, dtype=bool)
+    frame = frame[mask]
+    keep = _drop_singletons(frame, absorb)
+    frame, values = frame[keep], values[mask][keep]
+
+    factors = []
+    for col in absorb:
+        codes, uniques = pd.factorize(frame[col])
+        factors.append((codes, len(uniques)))
+    demeaned, sweeps = demean(values, factors)
+    X, y = demeaned[:, :-1], demeaned[:, -1]
+
+    # regressors without within variation are collinear with the fixed effects
+    raw_var = values[:, :-1].var(axis=0)
+    varies = X.var(axis=0) > 1e-9 * np.where(raw_var == 0, 1.0, raw_var)
+    kept = [f for f, v in zip(features, varies) if v]
+    X = X[:, varies]
+    if not kept or len(y) <= len(kept):
+        raise ValueError(f"nothing to estimate within {', '.join(absorb)} ({len(y)} rows, {len(kept)} regressors vary)")
+
+    XtX_inv = np.linalg.inv(X.T @ X)
+    beta = XtX_inv @ (X.T @ y)
+    resid = y - X @ beta
+
+    # cluster-robust (CR1) covariance: bread @ sum_g (X_g'e_g)(X_g'e_g)' @ bread
+    cluster_codes, cluster_ids = pd.factorize(frame[cluster])
+    n, p, n_clusters = len(y), X.shape[1], len(cluster_ids)
+    scores = _group_sums(X * resid[:, None], cluster_codes, n_clusters)
+    correction = n_clusters / (n_clusters - 1) * (n - 1) / (n - p)
+    cov = XtX_inv @ (scores.T @ scores) @ XtX_inv * correction
+    std_err = np.sqrt(np.diag(cov))
+    t = beta / std_err
+
+    sd = values.std(axis=0)
+    table = pd.DataFrame({
+        "coef": beta,
+        "std_err": std_err,
+        "t": t,
+        "p_value": 2 * stats.t.sf(np.abs(t), n_clusters - 1),
+        "std_coef": beta * sd[:-1][varies] / sd[-1],
+    }, index=pd.Index(kept, name="variable"))
+    return {
+        "table": table,
+        "absorbed": [f for f in features if f not in kept],
+        "r2_within": float(1 - resid @ resid / (y @ y)),
+        "n": n,
+        "n_clusters": n_clusters,
+        "n_groups": {col: n_groups for col, (_, n_groups) in zip(absorb, factors)},
+        "sweeps": sweeps,
+    }
@@ -1,200 +1,86 @@
-import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
-from sklearn.preprocessing import StandardScaler
-import statsmodels.api as sm
-
-# 1. Load cleaned panel and composite scores
-df = pd.read_csv("panel_df_cleaned.csv")
-pca_df = pd.read_csv("panel_with_all_pca.csv")
-clubs = pd.read_csv("clubs.csv")
-
-# Merge composite scores into cleaned panel (on player_id and year)
-composite_cols = [
-    "performance_composite_score",
-    "Attackers_composite_score",
-    "Midfielders_composite_score",
-    "Defenders_composite_score",
-    "Goalkeepers_composite_score"
-]
-merge_cols = ["player_id", "year"]
-
-df = df.merge(
-    pca_df[merge_cols + composite_cols],
-    on=merge_cols,
-    how="left"
-)
-
-# ========== Add Big5 league flag ==========
-df = df.merge(clubs[["club_id", "domestic_competition_id"]], on="club_id", how="left")
-big5_ids = ["GB1", "ES1", "IT1", "L1", "FR1"]
-df["is_big5_league"] = df["domestic_competition_id"].isin(big5_ids).astype(int)
-
-# One-hot encode 'foot'
-df = pd.get_dummies(df, columns=["foot"], drop_first=True)
-
-# Group country_of_citizenship into Top10/Other and one-hot encode
-top10_countries = ['France', 'Germany', 'Spain', 'Italy', 'Brazil', 'Argentina', 'England', 'Portugal', 'Netherlands', 'Croatia']
-df["country_group"] = df["country_of_citizenship"].apply(lambda x: "Top10" if x in top10_countries else "Other")
-df = pd.get_dummies(df, columns=["country_group"], drop_first=True)
-
-# ========== 回帰分析（market value, yearなし） ==========
-performance_features = ["performance_composite_score"]  # position_composite_scoreを除去
-non_performance_features = [
-    "age",
-    "height_in_cm",
-    "is_big5_league",
-]
-features = performance_features + non_performance_features
-features += [col for col in df.columns if col.startswith("foot_") or col.startswith("country_group_")]
-
-df_reg = df.dropna(subset=features + ["market_value_in_eur"])
-X = df_reg[features]
-y = np.log(df_reg["market_value_in_eur"].replace(0, np.nan))
-
-# 標準化
-scaler_X = StandardScaler()
-scaler_y = StandardScaler()
-X_std = scaler_X.fit_transform(X)
-y_std = scaler_y.fit_transform(y.values.reshape(-1, 1)).ravel()
-
-model = LinearRegression()
-model.fit(X_std, y_std)
-y_pred = model.predict(X_std)
-r2 = r2_score(y_std, y_pred)
-
-print("Standardized regression (market value, no year)")
-print("R² score:", r2)
-for name, coef in zip(X.columns, model.coef_):
-    print(f"  {name}: {coef:.4f}")
+import pandas as pd
 
-results_df = pd.DataFrame({
-    "feature": X.columns,
-    "coefficient": model.coef_
-})
-results_df["R2"] = r2
-results_df.to_csv("market_value_regression_coefficients.csv", index=False)
-print("Saved regression coefficients to 'market_value_regression_coefficients.csv'.")
+from fixed_effects import fit_fixed_effects
+from ols import fit_batch, print_result
+from regression_grid import feature_list, load_design
+from resampling import bootstrap, bootstrap_ci, cross_validate
+
+# Cluster bootstrap (by player_id) of the coefficients and K-fold CV (0: skip)
+N_BOOTSTRAP = 1000
+N_FOLDS = 5
+SEED = 0
+
+# Fixed effects absorbed in the within regressions (empty: skip), standard errors clustered by player
+FIXED_EFFECTS = ["player_id", "club_id", "year"]
+
+# 1. Load cleaned panel and composite scores, Big5 flag, foot / country dummies, log targets
+# (encoded once and cached under .cache/design; shared with every specification of regression_grid.py)
+df = load_design()
+
+# ========== 回帰分析（market value / transfer fee × yearなし / yearあり） ==========
+features = feature_list(df, "performance")  # position_composite_scoreを除去
+features_with_year = feature_list(df, "performance", year=True)
+
+# All four standardized regressions in one batch: specifications on the same rows
+# (with/without year) share one correlation matrix, each is a small Cholesky solve.
+specs = {
+    "market_value_regression_coefficients": {
+        "title": "market value, no year", "target": "log_market_value", "features": features},
+    "market_value_regression_coefficients_with_year": {
+        "title": "market value, with year", "target": "log_market_value", "features": features_with_year},
+    "transfer_fee_regression_coefficients": {
+        "title": "transfer fee, no year", "target": "log_transfer_fee", "features": features},
+    "transfer_fee_regression_coefficients_with_year": {
+        "title": "transfer fee, with year", "target": "log_transfer_fee", "features": features_with_year},
+}
+results = fit_batch(df, specs)
 
-# --- statsmodelsでp値を確認 ---
-X_std_const = sm.add_constant(X_std)
-sm_model = sm.OLS(y_std, X_std_const).fit()
-print(sm_model.summary())
 target_vars = ["performance_composite_score"]  # position_composite_scoreを除去
-for var in target_vars:
-    idx = list(X.columns).index(var) + 1
-    print(f"{var}: coef={sm_model.params[idx]:.4f}, p-value={sm_model.pvalues[idx]:.4g}")
-
-# ========== 回帰分析（market value, yearあり） ==========
-features_with_year = features + ["year"]
-df_reg2 = df.dropna(subset=features_with_year + ["market_value_in_eur"])
-X2 = df_reg2[features_with_year]
-y2 = np.log(df_reg2["market_value_in_eur"].replace(0, np.nan))
-
-scaler_X2 = StandardScaler()
-scaler_y2 = StandardScaler()
-X2_std = scaler_X2.fit_transform(X2)
-y2_std = scaler_y2.fit_transform(y2.values.reshape(-1, 1)).ravel()
-
-model2 = LinearRegression()
-model2.fit(X2_std, y2_std)
-y2_pred = model2.predict(X2_std)
-r2_2 = r2_score(y2_std, y2_pred)
-
-print("Standardized regression (market value, with year)")
-print("R² score:", r2_2)
-for name, coef in zip(X2.columns, model2.coef_):
-    print(f"  {name}: {coef:.4f}")
-
-results_df2 = pd.DataFrame({
-    "feature": X2.columns,
-    "coefficient": model2.coef_
-})
-results_df2["R2"] = r2_2
-results_df2.to_csv("market_value_regression_coefficients_with_year.csv", index=False)
-print("Saved regression coefficients to 'market_value_regression_coefficients_with_year.csv'.")
-
-# --- statsmodelsでp値を確認（yearあり） ---
-X2_std_const = sm.add_constant(X2_std)
-sm_model2 = sm.OLS(y2_std, X2_std_const).fit()
-print(sm_model2.summary())
-for var in target_vars + ["year"]:
-    idx = list(X2.columns).index(var) + 1
-    print(f"{var}: coef={sm_model2.params[idx]:.4f}, p-value={sm_model2.pvalues[idx]:.4g}")
-
-# ==================== transfer_fee ====================
-
-# 1. transfer_fee（yearなし）
-df_reg = df.dropna(subset=features + ["transfer_fee"])
-df_reg = df_reg[df_reg["transfer_fee"] > 0]
-X = df_reg[features]
-y = np.log(df_reg["transfer_fee"])
-
-scaler_X = StandardScaler()
-scaler_y = StandardScaler()
-X_std = scaler_X.fit_transform(X)
-y_std = scaler_y.fit_transform(y.values.reshape(-1, 1)).ravel()
-
-model = LinearRegression()
-model.fit(X_std, y_std)
-y_pred = model.predict(X_std)
-r2 = r2_score(y_std, y_pred)
-
-print("Standardized regression (transfer fee, no year)")
-print("R² score:", r2)
-for name, coef in zip(X.columns, model.coef_):
-    print(f"  {name}: {coef:.4f}")
-
-results_df = pd.DataFrame({
-    "feature": X.columns,
-    "coefficient": model.coef_
-})
-results_df["R2"] = r2
-results_df.to_csv("transfer_fee_regression_coefficients.csv", index=False)
-print("Saved regression coefficients to 'transfer_fee_regression_coefficients.csv'.")
-
-# --- statsmodelsでp値を確認 ---
-X_std_const = sm.add_constant(X_std)
-sm_model = sm.OLS(y_std, X_std_const).fit()
-print(sm_model.summary())
-for var in target_vars:
-    idx = list(X.columns).index(var) + 1
-    print(f"{var}: coef={sm_model.params[idx]:.4f}, p-value={sm_model.pvalues[idx]:.4g}")
-
-# 2. transfer_fee（yearあり）
-df_reg2 = df.dropna(subset=features_with_year + ["transfer_fee"])
-df_reg2 = df_reg2[df_reg2["transfer_fee"] > 0]
-X2 = df_reg2[features_with_year]
-y2 = np.log(df_reg2["transfer_fee"])
-
-scaler_X2 = StandardScaler()
-scaler_y2 = StandardScaler()
-X2_std = scaler_X2.fit_transform(X2)
-y2_std = scaler_y2.fit_transform(y2.values.reshape(-1, 1)).ravel()
-
-model2 = LinearRegression()
-model2.fit(X2_std, y2_std)
-y2_pred = model2.predict(X2_std)
-r2_2 = r2_score(y2_std, y2_pred)
-
-print("Standardized regression (transfer fee, with year)")
-print("R² score:", r2_2)
-for name, coef in zip(X2.columns, model2.coef_):
-    print(f"  {name}: {coef:.4f}")
-
-results_df2 = pd.DataFrame({
-    "feature": X2.columns,
-    "coefficient": model2.coef_
-})
-results_df2["R2"] = r2_2
-results_df2.to_csv("transfer_fee_regression_coefficients_with_year.csv", index=False)
-print("Saved regression coefficients to 'transfer_fee_regression_coefficients_with_year.csv'.")
-
-# --- statsmodelsでp値を確認（yearあり） ---
-X2_std_const = sm.add_constant(X2_std)
-sm_model2 = sm.OLS(y2_std, X2_std_const).fit()
-print(sm_model2.summary())
-for var in target_vars + ["year"]:
-    idx = list(X2.columns).index(var) + 1
-    print(f"{var}: coef={sm_model2.params[idx]:.4f}, p-value={sm_model2.pvalues[idx]:.4g}")
\ No newline at end of file
+for name, spec in specs.items():
+    result = results[name]
+    table = result["table"]
+
+    print(f"Standardized regression ({spec['title']})")
+    print("R² score:", result["r2"])
+    for feature, coef in table["std_coef"].items():
+        print(f"  {feature}: {coef:.4f}")
+
+    results_df = pd.DataFrame({
+        "feature": table.index,
+        "coefficient": table["std_coef"].to_numpy()
+    })
+    results_df["R2"] = result["r2"]
+    results_df.to_csv(f"{name}.csv", index=False)
+    print(f"Saved regression coefficients to '{name}.csv'.")
+
+    # --- t値・p値 ---
+    print_result(result, standardized=True)
+    for var in target_vars + (["year"] if "year" in spec["features"] else []):
+        print(f"{var}: coef={table.loc[var, 'std_coef']:.4f}, p-value={table.loc[var, 'p_value']:.4g}")
+
+    # --- bootstrap CI（player_id単位のクラスターブートストラップ）と交差検証 ---
+    if N_BOOTSTRAP:
+        draws = bootstrap(df, spec["target"], spec["features"], n_boot=N_BOOTSTRAP,
+                          clusters=df["player_id"], seed=SEED)
+        ci = bootstrap_ci(draws)
+        for var in target_vars:
+            print(f"{var}: 95% cluster bootstrap CI=[{ci.loc[var, 'lower']:.4f}, {ci.loc[var, 'upper']:.4f}], "
+                  f"bootstrap SE={ci.loc[var, 'std_err']:.4f} ({N_BOOTSTRAP} resamples)")
+    if N_FOLDS:
+        cv = cross_validate(df, spec["target"], spec["features"], k=N_FOLDS, clusters=df["player_id"], seed=SEED)
+        print(f"{N_FOLDS}-fold CV (grouped by player) out-of-fold R²: {cv['r2_test'].mean():.4f} "
+              f"(min {cv['r2_test'].min():.4f}, max {cv['r2_test'].max():.4f})")
+
+# ========== 固定効果モデル（player / club / year を吸収） ==========
+if FIXED_EFFECTS:
+    for target, title in [("log_market_value", "market value"), ("log_transfer_fee", "transfer fee")]:
+        print(f"Fixed-effects regression ({title}, absorbing {', '.join(FIXED_EFFECTS)})")
+        try:
+            fe = fit_fixed_effects(df, target, features, absorb=FIXED_EFFECTS, cluster="player_id")
+        except (ValueError, np.linalg.LinAlgError) as e:  # e.g. a regressor collinear with the fixed effects
+            print(f"  skipped: {e}")
+            continue
+        print(f"  n = {fe['n']}, clusters = {fe['n_clusters']}, within R² = {fe['r2_within']:.4f}")
+        print(f"  absorbed by the fixed effects: {', '.join(fe['absorbed']) or '-'}")
+        print(fe["table"].to_string(float_format=lambda v: f"{v:.4g}"))
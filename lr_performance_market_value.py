@@ -3,12 +3,13 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
-import statsmodels.api as sm
+
+from data_cache import load_table
+from ols import fit_batch, print_result, tidy_result
+from results_store import RESULTS_DB, write_results
 
 # read data
-panel_pca = pd.read_csv("panel_with_all_pca.csv")
+panel_pca = load_table("panel_with_all_pca")
 
 # group by position
 position_groups = {
@@ -18,52 +19,44 @@ position_groups = {
     'Goalkeepers': ['Goalkeeper']
 }
 
-# linear regression function
-def analyze_market_value_regression(df, position_group):
-    """
-    特定のポジショングループに対して市場価値の回帰分析を実行
-    """
-    # extract relevant data for the position group
-    pos_mask = df['position'].isin(position_groups[position_group])
-    pos_df = df[pos_mask].copy()
-
-    X = pos_df[['performance_composite_score', f'{position_group}_composite_score']]
-    y = np.log(pos_df['market_value_in_eur'].replace(0, 1))
-    mask = ~(X.isna().any(axis=1) | y.isna())
-    X = X[mask]
-    y = y[mask]
-    
-    # linear regression model
-    model = LinearRegression()
-    model.fit(X, y)
+panel_pca["log_market_value"] = np.log(panel_pca['market_value_in_eur'].replace(0, 1))
 
-    # t値・p値を出す（statsmodels）
-    X_sm = sm.add_constant(X)
-    ols_model = sm.OLS(y, X_sm).fit()
+# one specification per position group, fitted in one batch
+specs = {
+    position_group: {
+        "target": "log_market_value",
+        "features": ['performance_composite_score', f'{position_group}_composite_score'],
+        "rows": panel_pca['position'].isin(positions).to_numpy(),
+    }
+    for position_group, positions in position_groups.items()
+}
+fits = fit_batch(panel_pca, specs)
 
-    # results
-    results = {
+# conduct regression analysis for each position group
+tidy = []
+for position_group in position_groups.keys():
+    fit = fits[position_group]
+    table = fit["table"]
+    tvalues = {"const": fit["intercept_t"], **table["t"].to_dict()}
+    pvalues = {"const": fit["intercept_p"], **table["p_value"].to_dict()}
+    result = {
         'position_group': position_group,
-        'sample_size': len(X),
-        'r2_score': r2_score(y, model.predict(X)),
-        'coefficients': dict(zip(X.columns, model.coef_)),
-        'intercept': model.intercept_,
-        'tvalues': {k: v for k, v in ols_model.tvalues.to_dict().items() if k != 'age'},
-        'pvalues': {k: v for k, v in ols_model.pvalues.to_dict().items() if k != 'age'}
+        'sample_size': fit["n"],
+        'r2_score': fit["r2"],
+        'coefficients': table["coef"].to_dict(),
+        'intercept': fit["intercept"],
+        'tvalues': tvalues,
+        'pvalues': pvalues
     }
+    rows = tidy_result(fit)
+    rows.insert(0, "spec", position_group)
+    rows.insert(1, "target", "market_value_in_eur")
+    rows.insert(2, "feature_set", "scores_only")
+    rows.insert(3, "position_group", position_group)
+    tidy.append(rows)
 
-    # summary
-    print(f"\n[statsmodels summary for {position_group}]")
-    print(ols_model.summary())
-
-    return results
+    print_result(fit, title=f"\n[OLS summary for {position_group}]")
 
-# conduct regression analysis for each position group
-results = []
-for position_group in position_groups.keys():
-    result = analyze_market_value_regression(panel_pca, position_group)
-    results.append(result)
-    
     print(f"\nResults for {position_group}:")
     print(f"Sample size: {result['sample_size']}")
     print(f"R² score: {result['r2_score']:.3f}")
@@ -77,6 +70,6 @@ for position_group in position_groups.keys():
     for k, v in result['pvalues'].items():
         print(f"  {k}: {v:.4f}")
 
-results_df = pd.DataFrame(results)
-results_df.to_csv("regression_results_market_value_by_position.csv", index=False)
-print("\nSaved regression results to 'regression_results_market_value_by_position.csv'")
\ No newline at end of file
+# one row per (position group, variable) with typed values; see table_lr_performance_market_value.py
+run_id = write_results(pd.concat(tidy, ignore_index=True), script="lr_performance_market_value")
+print(f"\nSaved regression results to '{RESULTS_DB}' (run {run_id})")
@@ -1,71 +1,111 @@
+import os
+import warnings
+
 import pandas as pd
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-import numpy as np 
-
-# Load the cleaned panel
-panel_df = pd.read_csv("panel_df_cleaned.csv")
-
-# Select performance-related features for PCA
-pca_features = [
-    "minutes_played", "goals", "assists",
-    "yellow_cards", "red_cards", "appearances",
-    "goals_per_90", "assists_per_90",
-    "starts", "subs"
-]
-
-# Replace missing values with 0 (interpreted as 'no performance')
-X = panel_df[pca_features].fillna(0)
-
-# Standardize the data (important for PCA)
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-
-# Run PCA
-pca = PCA(n_components=5)
-principal_components = pca.fit_transform(X_scaled)
-
-# Add PC1, PC2, PC3 to dataframe
-panel_df["performance_score"] = principal_components[:, 0]
-panel_df["performance_score_2"] = principal_components[:, 1]
-panel_df["performance_score_3"] = principal_components[:, 2]
-panel_df["performance_score_4"] = principal_components[:, 3]
-panel_df["performance_score_5"] = principal_components[:, 4]
-
-# Print explained variance for interpretability check
-print("Explained variance ratios:")
-for i, ratio in enumerate(pca.explained_variance_ratio_):
-    print(f"PC{i+1}: {ratio:.4f}")
-
-# Optional: print component loadings for interpretation
-loadings = pd.DataFrame(
-    pca.components_.T,
-    index=pca_features,
-    columns=["PC1", "PC2", "PC3", "PC4", "PC5"]
-)
-print("\nPCA Component Loadings:")
-print(loadings)
-# Calculate and save the weighted loading vector
-weights = pca.explained_variance_ratio_  # この行を追加
-weighted_loadings = np.zeros(len(pca_features))
-for i in range(5):
-    weighted_loadings += weights[i] * pca.components_[i]
-
-weighted_loadings_df = pd.DataFrame({
-    'feature': pca_features,
-    'weighted_loading': weighted_loadings
-})
-print("\nWeighted Feature Loadings:")
-print(weighted_loadings_df.sort_values('weighted_loading', ascending=False))
-
-# 加重平均されたコンポジットスコアも計算
-composite_score = np.zeros(len(X))
-for i in range(5):
-    composite_score += weights[i] * principal_components[:, i]
-
-# コンポジットスコアをDataFrameに追加
-panel_df["performance_composite_score"] = composite_score
-
-# Save the updated dataframe with scores
-panel_df.to_csv("panel_with_pca.csv", index=False)
-print("Saved PCA results to 'panel_with_pca.csv'.")
\ No newline at end of file
+
+from data_cache import iter_table, load_table, table_sha256
+from pca_models import PCAScorer, component_drift, load_model, model_from_fit, save_model
+from performance_pca import (PCA_FEATURES, composite_score, feature_matrix, fit_pca, fit_streaming_pca,
+                             load_features, weighted_loadings)
+
+# Feature list kept under its old name (defined in performance_pca.py)
+pca_features = PCA_FEATURES
+
+# Rows per chunk for the out-of-core mode (None: fit on the whole panel in memory).
+# The out-of-core mode accumulates the exact covariance chunk by chunk, then scores
+# the panel in a second streaming pass. Also settable via PCA_CHUNKSIZE (pipeline.py --param).
+CHUNKSIZE = int(os.environ.get("PCA_CHUNKSIZE", 0)) or None
+
+# Identifies the panel the saved models are fitted on
+source = table_sha256("panel_df_cleaned")
+
+if CHUNKSIZE is not None:
+    # ========== Out-of-core PCA ==========
+    # Pass 1: running means / covariance of the features
+    model = fit_streaming_pca(iter_table("panel_df_cleaned", CHUNKSIZE), pca_features, n_components=5)
+
+    print("Explained variance ratios:")
+    for i, ratio in enumerate(model["composite_weights"]):
+        print(f"PC{i+1}: {ratio:.4f}")
+    loadings = pd.DataFrame(model["components"].T, index=pca_features, columns=["PC1", "PC2", "PC3", "PC4", "PC5"])
+    print("\nPCA Component Loadings:")
+    print(loadings)
+
+    # Drift against the last exact (in-memory) fit, if it was fitted on this same panel
+    try:
+        reference = load_model("performance")
+    except FileNotFoundError:
+        print("\n(no batch model saved yet, run without CHUNKSIZE once to compare)")
+    else:
+        if reference.get("source") == source and reference["n_samples"] == model["n_samples"]:
+            print("\nDrift from the batch PCA model 'performance':")
+            print(component_drift(model, reference).to_string(index=False))
+        else:
+            warnings.warn(f"Batch PCA model 'performance' (v{reference['version']}) was fitted on different data"
+                          f" ({reference['n_samples']} rows vs {model['n_samples']}); skipping the drift report."
+                          " Run without CHUNKSIZE once to refit it on this panel.")
+
+    version = save_model(model, "performance_streaming", source=source)
+    print(f"Saved PCA model 'performance_streaming' (v{version}) to 'models/'.")
+
+    # Pass 2: score every chunk and append it to the output
+    scorer = PCAScorer(model)
+    score_cols = ["performance_score", "performance_score_2", "performance_score_3",
+                  "performance_score_4", "performance_score_5", "performance_composite_score"]
+    for i, chunk in enumerate(iter_table("panel_df_cleaned", CHUNKSIZE)):
+        chunk[score_cols] = scorer.score(feature_matrix(chunk, pca_features).to_numpy(dtype="float64"))
+        chunk.to_csv("panel_with_pca.csv", index=False, mode="w" if i == 0 else "a", header=(i == 0))
+    print("Saved PCA results to 'panel_with_pca.csv'.")
+
+else:
+    # Load the cleaned panel
+    panel_df = load_table("panel_df_cleaned")
+
+    # Features with missing values replaced by 0 (interpreted as 'no performance'),
+    # memory-mapped from the block written by the cleaning stage
+    X = load_features(panel_df).matrix(pca_features)
+
+    # Standardize the data and run PCA
+    scaler, pca, principal_components = fit_pca(X, n_components=5)
+
+    # Add PC1, PC2, PC3 to dataframe
+    panel_df["performance_score"] = principal_components[:, 0]
+    panel_df["performance_score_2"] = principal_components[:, 1]
+    panel_df["performance_score_3"] = principal_components[:, 2]
+    panel_df["performance_score_4"] = principal_components[:, 3]
+    panel_df["performance_score_5"] = principal_components[:, 4]
+
+    # Print explained variance for interpretability check
+    print("Explained variance ratios:")
+    for i, ratio in enumerate(pca.explained_variance_ratio_):
+        print(f"PC{i+1}: {ratio:.4f}")
+
+    # Optional: print component loadings for interpretation
+    loadings = pd.DataFrame(
+        pca.components_.T,
+        index=pca_features,
+        columns=["PC1", "PC2", "PC3", "PC4", "PC5"]
+    )
+    print("\nPCA Component Loadings:")
+    print(loadings)
+    # Calculate and save the weighted loading vector
+    weights = pca.explained_variance_ratio_
+    weighted_loadings_df = pd.DataFrame({
+        'feature': pca_features,
+        'weighted_loading': weighted_loadings(pca)
+    })
+    print("\nWeighted Feature Loadings:")
+    print(weighted_loadings_df.sort_values('weighted_loading', ascending=False))
+
+    # 加重平均されたコンポジットスコアも計算
+    # コンポジットスコアをDataFrameに追加
+    panel_df["performance_composite_score"] = composite_score(principal_components, weights)
+
+    # Save the fitted scaler/PCA so new player-seasons can be scored without refitting
+    # (pca_models.PCAScorer.load("performance"))
+    version = save_model(model_from_fit(scaler, pca, pca_features), "performance", source=source)
+    print(f"Saved PCA model 'performance' (v{version}) to 'models/'.")
+
+    # Save the updated dataframe with scores
+    panel_df.to_csv("panel_with_pca.csv", index=False)
+    print("Saved PCA results to 'panel_with_pca.csv'.")
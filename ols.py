@@ -0,0 +1,193 @@
+# Closed-form OLS for the regression scripts
+#
+# All specifications that use the same rows share one standardized Gram
+# (correlation) matrix; each specification is then a small Cholesky solve on
+# a sub-block of it. Coefficients, standard errors, t/p-values and R² match
+# LinearRegression + statsmodels OLS (with a constant) on the same rows.
+import numpy as np
+import pandas as pd
+
+
+def _values(data, columns, mask=None):
+    """float64 values of columns (on the rows of mask) from a DataFrame or a design_matrix.DesignMatrix."""
+    if hasattr(data, "matrix"):
+        return data.matrix(columns, mask)
+    values = data[list(columns)].to_numpy(dtype=np.float64)
+    return values if mask is None else values[mask]
+
+
+def _finite(data, columns):
+    if hasattr(data, "finite_mask"):
+        return data.finite_mask(columns)
+    return np.isfinite(data[list(columns)].to_numpy(dtype=np.float64)).all(axis=1)
+
+
+def _pvalues(t, df_resid):
+    from scipy import stats
+
+    return 2 * stats.t.sf(np.abs(t), df_resid)
+
+
+class Gram:
+    """
+    Correlation matrix of `columns` over the rows of `data` (a DataFrame or a
+    design_matrix.DesignMatrix) where all of them are finite, plus the means/standard deviations needed to undo the
+    standardization. Build once, then solve() any y ~ X subset.
+    """
+
+    def __init__(self, data, columns, mask=None):
+        if mask is None:
+            mask = _finite(data, columns)
+        values = _values(data, columns, mask)
+        self.columns = list(columns)
+        self.position = {c: i for i, c in enumerate(self.columns)}
+        self.mask = mask
+        self.n = len(values)
+        self.mean = values.mean(axis=0)
+        # population std like StandardScaler (the ratio sd_x / sd_y is what matters)
+        self.std = values.std(axis=0)
+        safe_std = np.where(self.std == 0, 1.0, self.std)
+        Z = (values - self.mean) / safe_std
+        self.corr = Z.T @ Z / self.n
+
+    def solve(self, target, features):
+        """
+        Regress target on features (with an intercept).
+
+        Returns a dict with the coefficient table (standardized and raw
+        coefficients, standard errors, t and p-values, indexed by feature),
+        the intercept with its standard error/t/p, R², n and residual df.
+        """
+        ix = [self.position[f] for f in features]
+        iy = self.position[target]
+        R_xx = self.corr[np.ix_(ix, ix)]
+        r_xy = self.corr[ix, iy]
+
+        # one Cholesky factorization gives both the solution and (X'X)^-1
+        L = np.linalg.cholesky(R_xx)
+        L_inv = np.linalg.solve(L, np.eye(len(ix)))
+        R_inv = L_inv.T @ L_inv
+        beta = R_inv @ r_xy
+
+        n = self.n
+        p = len(ix)
+        df_resid = n - p - 1
+        r2 = float(r_xy @ beta)
+        # residual variance of the standardized model (y has unit variance)
+        sigma2 = max(1.0 - r2, 0.0) * n / df_resid
+        se_std = np.sqrt(np.diag(R_inv) * sigma2 / n)
+        t = beta / se_std
+
+        # back to the original units
+        sd_x = np.where(self.std[ix] == 0, 1.0, self.std[ix])
+        sd_y = self.std[iy]
+        coef = beta * sd_y / sd_x
+        intercept = self.mean[iy] - coef @ self.mean[ix]
+        u = self.mean[ix] / sd_x
+        se_intercept = sd_y * np.sqrt(sigma2 / n * (1.0 + u @ R_inv @ u))
+
+        table = pd.DataFrame({
+            "coef": coef,
+            "std_err": se_std * sd_y / sd_x,
+            "std_coef": beta,
+            "std_coef_err": se_std,
+            "t": t,
+            "p_value": _pvalues(t, df_resid),
+        }, index=pd.Index(features, name="variable"))
+        t_intercept = intercept / se_intercept if se_intercept > 0 else np.nan
+        return {
+            "table": table,
+            "intercept": float(intercept),
+            "intercept_std_err": float(se_intercept),
+            "intercept_t": float(t_intercept),
+            "intercept_p": float(_pvalues(t_intercept, df_resid)),
+            # the intercept of the standardized model is 0 by construction
+            "std_intercept_err": float(np.sqrt(sigma2 / n)),
+            "r2": r2,
+            "n": n,
+            "df_resid": df_resid,
+        }
+
+
+def vif(gram, features):
+    """
+    Variance inflation factors of `features` on the rows of `gram`: the
+    diagonal of the inverse of their correlation matrix (one inversion instead
+    of one auxiliary regression per feature). Perfectly collinear sets give inf.
+    """
+    ix = [gram.position[f] for f in features]
+    try:
+        values = np.diag(np.linalg.inv(gram.corr[np.ix_(ix, ix)]))
+    except np.linalg.LinAlgError:
+        values = np.full(len(ix), np.inf)
+    return pd.Series(values, index=pd.Index(features, name="variable"), name="VIF")
+
+
+def spec_row_groups(data, specs):
+    """
+    Group specifications by the rows they are fitted on.
+
+    specs maps a name to {"target": column, "features": [columns]} and
+    optionally "rows" (a boolean mask aligned with data, e.g. one position
+    group). Rows with a missing/infinite value in any of a specification's
+    columns are dropped. Returns a list of {"mask", "columns", "specs"}, one
+    per distinct row set, with the union of the columns its specs use.
+    """
+    groups = {}
+    for name, spec in specs.items():
+        cols = list(spec["features"]) + [spec["target"]]
+        mask = _finite(data, cols)
+        if spec.get("rows") is not None:
+            mask &= np.asarray(spec["rows"], dtype=bool)
+        group = groups.setdefault(mask.tobytes(), {"mask": mask, "columns": [], "specs": []})
+        group["columns"] += [c for c in cols if c not in group["columns"]]
+        group["specs"].append(name)
+    return list(groups.values())
+
+
+def fit_batch(data, specs):
+    """
+    Fit many specifications at once (see spec_row_groups for the format);
+    specifications on the same rows share one Gram matrix.
+    Returns {name: result of Gram.solve()}.
+    """
+    results = {}
+    for group in spec_row_groups(data, specs):
+        gram = Gram(data, group["columns"], group["mask"])
+        for name in group["specs"]:
+            results[name] = gram.solve(specs[name]["target"], specs[name]["features"])
+    return results
+
+
+def tidy_result(result):
+    """One row per variable ("const" first) with n and R² repeated: the long format of results_store."""
+    table = result["table"]
+    const = pd.DataFrame({
+        "coef": [result["intercept"]],
+        "std_err": [result["intercept_std_err"]],
+        "std_coef": [0.0],
+        "std_coef_err": [result["std_intercept_err"]],
+        "t": [result["intercept_t"]],
+        "p_value": [result["intercept_p"]],
+    }, index=pd.Index(["const"], name="variable"))
+    rows = pd.concat([const, table]).reset_index()
+    rows["n"] = result["n"]
+    rows["r2"] = result["r2"]
+    return rows
+
+
+def print_result(result, title=None, standardized=False):
+    """Compact coefficient table (what the scripts used statsmodels' summary() for)."""
+    if title:
+        print(title)
+    print(f"  n = {result['n']}, R² = {result['r2']:.4f}")
+    table = result["table"]
+    if standardized:
+        coef, err = table["std_coef"], table["std_coef_err"]
+        const = (0.0, result["std_intercept_err"], 0.0, 1.0)
+    else:
+        coef, err = table["coef"], table["std_err"]
+        const = (result["intercept"], result["intercept_std_err"], result["intercept_t"], result["intercept_p"])
+    rows = pd.DataFrame({"coef": coef, "std err": err, "t": table["t"], "P>|t|": table["p_value"]})
+    rows = pd.concat([pd.DataFrame([const], columns=rows.columns, index=["const"]), rows])
+    print(rows.to_string(float_format=lambda v: f"{v:.4g}"))
@@ -0,0 +1,313 @@
+# Builds the player-year panel (panel_df.csv) from the raw Transfermarkt tables
+#
+# Every source table is reduced to partial per-(player_id, year) aggregates.
+# In the default mode each table is one "chunk"; in streaming mode
+# (chunksize=N) the tables are read N rows at a time and the partial
+# aggregates are folded together, so peak memory is bounded by the chunk
+# size plus the size of the aggregates, not by the size of the sources.
+# Both modes run the same code and give the same panel_df.csv.
+import pandas as pd
+
+from asof import asof_candidates, asof_join
+from data_cache import iter_table, load_table
+from features import (
+    DEFENSIVE_KEYWORDS,
+    add_age,
+    club_counts,
+    dominant_club_from_counts,
+    keyword_flags,
+)
+
+PANEL_KEYS = ["player_id", "year"]
+
+# Columns read from each source table
+APPEARANCE_COLUMNS = ["game_id", "player_id", "player_club_id", "date", "player_name",
+                      "minutes_played", "goals", "assists", "yellow_cards", "red_cards"]
+VALUATION_COLUMNS = ["player_id", "date", "market_value_in_eur"]
+TRANSFER_COLUMNS = ["player_id", "transfer_date", "transfer_fee"]
+LINEUP_COLUMNS = ["player_id", "date", "type"]
+EVENT_COLUMNS = ["player_id", "date", "description"]
+PLAYER_COLUMNS = ["player_id", "sub_position", "foot", "height_in_cm", "country_of_citizenship", "date_of_birth"]
+CLUB_COLUMNS = ["club_id", "name", "total_market_value"]
+
+# Aggregation of appearances per player-year ("first" and "sum" fold across chunks as-is)
+APPEARANCE_AGG = {
+    "player_name": "first",
+    "minutes_played": "sum",
+    "goals": "sum",
+    "assists": "sum",
+    "yellow_cards": "sum",
+    "red_cards": "sum",
+    "game_id": "count"
+}
+APPEARANCE_FOLD = {**APPEARANCE_AGG, "game_id": "sum"}
+
+
+class _Fold:
+    """
+    Collects partial aggregates and merges them with `combine` whenever more
+    than `max_rows` partial rows are pending (max_rows=None: only at the end).
+    Partials are kept in input order, so "first"/"last" style folds stay exact.
+    """
+
+    def __init__(self, combine, max_rows=None):
+        self.combine = combine
+        self.max_rows = max_rows
+        self.parts = []
+        self.pending_rows = 0
+
+    def add(self, part):
+        self.parts.append(part)
+        self.pending_rows += len(part)
+        if self.max_rows is not None and self.pending_rows > self.max_rows and len(self.parts) > 1:
+            self.parts = [self.combine(pd.concat(self.parts))]
+            self.pending_rows = len(self.parts[0])
+
+    def result(self):
+        if len(self.parts) == 1:
+            return self.combine(self.parts[0])
+        return self.combine(pd.concat(self.parts))
+
+
+def _sum_by_index(df):
+    return df.groupby(level=list(range(df.index.nlevels))).sum()
+
+
+def _restrict(df, only_keys, date_col="date"):
+    """Keep only rows whose (player_id, year of date_col) is in only_keys (None: keep all)."""
+    if only_keys is None:
+        return df
+    keys = pd.MultiIndex.from_arrays([df["player_id"], df[date_col].dt.year])
+    return df[keys.isin(only_keys)].copy()
+
+
+def _restrict_players(df, only_keys):
+    """Keep only rows of the players in only_keys (None: keep all); as-of matches may come from other years."""
+    if only_keys is None:
+        return df
+    return df[df["player_id"].isin(only_keys.get_level_values("player_id"))].copy()
+
+
+# ==============Partial aggregates per source chunk==============
+# keys: PANEL_KEYS for the player-year panel, or e.g. ["player_id", "date"]
+# for the match-day cubes of cubes.py
+def appearance_partials(df_app, keys=PANEL_KEYS):
+    df_app["year"] = df_app["date"].dt.year  # extract "year" from "date" as datetime object
+    stats = df_app.groupby(keys).agg(APPEARANCE_AGG)
+    clubs = club_counts(df_app, keys=keys, club_col="player_club_id")
+    return stats, clubs
+
+
+def valuation_partials(df_val, season="calendar", at="end"):
+    # the valuations an as-of join at `at` can pick (see asof.asof_candidates)
+    return asof_candidates(df_val[VALUATION_COLUMNS], "date", season=season, at=at)
+
+
+def transfer_partials(df_transfers, season="calendar", at="end"):
+    return asof_candidates(df_transfers[TRANSFER_COLUMNS], "transfer_date", season=season, at=at)
+
+
+def lineup_partials(df_lineups, keys=PANEL_KEYS):
+    df_lineups["year"] = df_lineups["date"].dt.year
+    return df_lineups.groupby(list(keys) + ["type"]).size()
+
+
+def defense_partials(df_events, keywords=DEFENSIVE_KEYWORDS, keys=PANEL_KEYS):
+    df_events["year"] = df_events["date"].dt.year
+    cols = [f"{k}s" for k in keywords]
+    df_events[cols] = keyword_flags(df_events["description"], keywords)
+    return df_events.groupby(keys)[cols].sum()
+
+
+def _fold_appearance_stats(df):
+    return df.groupby(level=list(df.index.names)).agg(APPEARANCE_FOLD)
+
+
+# ==============Per-table aggregation==============
+# fold_*: partial aggregates of every chunk folded into one per `keys`
+# (summing them again over coarser keys gives the aggregates over those);
+# aggregate_*: the finished per-player-year tables of the panel
+def fold_appearances(chunksize=None, data_dir=".", only_keys=None, keys=PANEL_KEYS):
+    """(stats, club counts) of the appearances per `keys`."""
+    stats_fold = _Fold(_fold_appearance_stats, chunksize)
+    clubs_fold = _Fold(_sum_by_index, chunksize)
+    for chunk in iter_table("appearances", chunksize, APPEARANCE_COLUMNS, data_dir):
+        stats, clubs = appearance_partials(_restrict(chunk, only_keys), keys)
+        stats_fold.add(stats)
+        clubs_fold.add(clubs)
+    return stats_fold.result(), clubs_fold.result()
+
+
+def appearance_stats(stats, clubs):
+    """Finished appearance columns from folded (stats, club counts): appearances, club_id, per-90 rates."""
+    player_yearly = stats.rename(columns={"game_id": "appearances"})
+
+    # For each player-year, get the most frequent club (in case of mid-season transfer)
+    # (ties go to the smallest club id, same as Series.mode().iloc[0])
+    club_mode = dominant_club_from_counts(clubs, player_yearly.index, "player_club_id")
+
+    keys = list(player_yearly.index.names)
+    player_yearly = player_yearly.reset_index()
+    player_yearly["goals_per_90"] = player_yearly["goals"] / player_yearly["minutes_played"].replace(0, pd.NA) * 90 # normalizing goalscoring efficiency
+    player_yearly["assists_per_90"] = player_yearly["assists"] / player_yearly["minutes_played"].replace(0,pd.NA) * 90 # normalizing assist efficiency
+    return player_yearly.merge(club_mode, on=keys, how="left")
+
+
+def aggregate_appearances(chunksize=None, data_dir=".", only_keys=None):
+    return appearance_stats(*fold_appearances(chunksize, data_dir, only_keys))
+
+
+def aggregate_valuations(chunksize=None, data_dir=".", only_keys=None, season="calendar", at="end"):
+    # candidate valuations for the as-of join (at most two per player and period)
+    fold = _Fold(lambda df: asof_candidates(df, "date", season=season, at=at), chunksize)
+    for chunk in iter_table("player_valuations", chunksize, VALUATION_COLUMNS, data_dir):
+        fold.add(valuation_partials(_restrict_players(chunk, only_keys), season, at))
+    return fold.result()
+
+
+def aggregate_transfers(chunksize=None, data_dir=".", only_keys=None, season="calendar", at="end"):
+    # candidate transfers for the as-of join (at most two per player and period)
+    fold = _Fold(lambda df: asof_candidates(df, "transfer_date", season=season, at=at), chunksize)
+    for chunk in iter_table("transfers", chunksize, TRANSFER_COLUMNS, data_dir):
+        fold.add(transfer_partials(_restrict_players(chunk, only_keys), season, at))
+    return fold.result()
+
+
+def fold_lineups(chunksize=None, data_dir=".", only_keys=None, keys=PANEL_KEYS):
+    """Lineup counts per (keys..., type)."""
+    fold = _Fold(_sum_by_index, chunksize)
+    for chunk in iter_table("game_lineups", chunksize, LINEUP_COLUMNS, data_dir):
+        fold.add(lineup_partials(_restrict(chunk, only_keys), keys))
+    return fold.result()
+
+
+def starts_and_subs(counts):
+    """starts / subs columns from folded lineup counts."""
+    stats = counts.unstack(fill_value=0)
+    for col in ["starting_lineup", "substitutes"]:
+        if col not in stats.columns:  # e.g. a restricted build without any substitutes
+            stats[col] = 0
+    stats = stats.reset_index()
+    return stats.rename(columns={"starting_lineup": "starts", "substitutes": "subs"})
+
+
+def aggregate_lineups(chunksize=None, data_dir=".", only_keys=None):
+    # Count number of starts and subs by player-year
+    return starts_and_subs(fold_lineups(chunksize, data_dir, only_keys))
+
+
+def fold_defense(chunksize=None, data_dir=".", keywords=DEFENSIVE_KEYWORDS, only_keys=None, keys=PANEL_KEYS):
+    """Defensive action counts per `keys`."""
+    fold = _Fold(_sum_by_index, chunksize)
+    for chunk in iter_table("game_events", chunksize, EVENT_COLUMNS, data_dir):
+        fold.add(defense_partials(_restrict(chunk, only_keys), keywords, keys))
+    return fold.result()
+
+
+def aggregate_defense(chunksize=None, data_dir=".", keywords=DEFENSIVE_KEYWORDS, only_keys=None):
+    # Group by player_id and year, summing each defensive action
+    return fold_defense(chunksize, data_dir, keywords, only_keys).reset_index()
+
+
+# ==========Merge all stats into panel_df================
+def build_panel_df(chunksize=None, data_dir=".", keywords=DEFENSIVE_KEYWORDS, only_keys=None,
+                   valuation_at="end", transfer_at="end", lookback=None):
+    """
+    Build the player-year panel (calendar years of the match dates).
+
+    chunksize=None loads every source table at once (through the columnar
+    cache); chunksize=N streams the large tables N rows at a time.
+    only_keys (a (player_id, year) MultiIndex) restricts the build to those
+    player-years, which is what the incremental update in panel_incremental.py uses.
+
+    Market value and transfer fee of a player-year are attached by an as-of
+    join (asof.asof_join): the last valuation / transfer before the reference
+    date valuation_at / transfer_at ("end" or "MM-DD") of the year, since the
+    start of the year or within `lookback`. The defaults give the last
+    valuation and the last transfer of the calendar year; the incremental
+    update assumes them. Panels per football season (stats and as-of dates
+    alike) are built by cubes.build_bucketed_panel.
+    """
+    return assemble_panel(
+        aggregate_appearances(chunksize, data_dir, only_keys),
+        aggregate_valuations(chunksize, data_dir, only_keys, at=valuation_at),
+        aggregate_transfers(chunksize, data_dir, only_keys, at=transfer_at),
+        aggregate_lineups(chunksize, data_dir, only_keys),
+        aggregate_defense(chunksize, data_dir, keywords, only_keys),
+        data_dir, valuation_at=valuation_at, transfer_at=transfer_at, lookback=lookback,
+    )
+
+
+def assemble_panel(player_yearly, valuations, transfers, lineup_stats, defense_stats, data_dir=".",
+                   keys=PANEL_KEYS, season="calendar", valuation_at="end", transfer_at="end", lookback=None,
+                   bounds=None):
+    """
+    The panel from the per-period tables (one row per `keys` in player_yearly).
+    bounds: optional (start, end) dates of each row's period, for periods
+    that are not a year of `season` (see cubes.py); the valuation and the
+    transfer are then taken as of the period end.
+    """
+    # Attach the valuation and the transfer fee as of the reference dates (one match per row)
+    merged_df = pd.concat([
+        player_yearly,
+        asof_join(player_yearly, valuations, "date", ["market_value_in_eur"],
+                  season=season, at=valuation_at, lookback=lookback, bounds=bounds),
+        asof_join(player_yearly, transfers, "transfer_date", ["transfer_fee"],
+                  season=season, at=transfer_at, lookback=lookback, bounds=bounds),
+    ], axis=1)
+
+    # Merge club name and total_market_value into merged_df using club_id
+    df_clubs = load_table("clubs", data_dir=data_dir)
+    merged_df = merged_df.merge(df_clubs[CLUB_COLUMNS], on="club_id", how="left")
+    # 'name' is club name, 'total_market_value' is club's market value
+
+    # Adding player information to the merged dataframe
+    df_players = load_table("players", data_dir=data_dir)  # date_of_birth is parsed with errors="coerce"
+    panel_df = merged_df.merge(df_players[PLAYER_COLUMNS], on="player_id", how="left")
+
+    # Use sub_position instead of position for clarity
+    panel_df = panel_df.rename(columns={"sub_position": "position"})
+
+    panel_df = add_age(panel_df)  # year - date_of_birth.year, NaN if unknown
+
+    panel_df = panel_df.merge(lineup_stats[list(keys) + ["starts", "subs"]], on=keys, how="left")
+    panel_df = panel_df.merge(defense_stats, on=keys, how="left")
+    return panel_df
+
+
+# ==========Cleaning (panel_df.csv -> panel_df_cleaned.csv)================
+def clean_panel_df(panel_df):
+    """Row-wise cleaning of the panel; returns (panel_df_cleaned, number of dropped rows)."""
+    # Drop rows with critical missing values (e.g., minutes_played is essential)
+    before = len(panel_df)
+    panel_df_cleaned = panel_df.dropna(subset=["minutes_played", "goals", "assists"]).copy()
+    dropped = before - len(panel_df_cleaned)
+
+    # 2. Fill or flag less critical fields
+    # Fill red_cards and yellow_cards with 0 if missing (assumption: no card)
+    panel_df_cleaned["yellow_cards"] = panel_df_cleaned["yellow_cards"].fillna(0).astype(int)
+    panel_df_cleaned["red_cards"] = panel_df_cleaned["red_cards"].fillna(0).astype(int)
+
+    # Fill market_value and transfer_fee with a placeholder or keep NaN depending on purpose
+    # For analysis where presence of value is necessary:
+    # panel_df_cleaned = panel_df_cleaned.dropna(subset=["market_value_in_eur"])
+
+    # Alternate option: fill with 0 (if "no value" is valid)
+    # panel_df_cleaned["market_value_in_eur"] = panel_df_cleaned["market_value_in_eur"].fillna(0)
+    # panel_df_cleaned["transfer_fee"] = panel_df_cleaned["transfer_fee"].fillna(0)
+
+    # Fill categorical info if desired
+    panel_df_cleaned["position"] = panel_df_cleaned["position"].astype(object).fillna("Unknown")
+
+    # Fill missing values with 0 for new columns
+    for col in ["defensive_contributions", "starts", "subs", "saves", "penalty_saves"]:
+        if col in panel_df_cleaned.columns:
+            panel_df_cleaned[col] = panel_df_cleaned[col].fillna(0).astype(int)
+
+    # Add club_id, club name, and total_market_value columns if not already present
+    # (Assumes these were added in create_panel_df.py)
+    for col in ["club_id", "name", "total_market_value"]:
+        if col not in panel_df_cleaned.columns and col in panel_df.columns:
+            panel_df_cleaned[col] = panel_df[col]
+
+    return panel_df_cleaned, dropped
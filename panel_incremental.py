@@ -0,0 +1,144 @@
+# Incremental update of panel_df.csv / panel_df_cleaned.csv
+#
+# Instead of rebuilding every season, we keep a hash of every source row
+# (.cache/panel_state/<table>.*) together with the keys it contributes to.
+# On the next run new, changed and deleted rows are found by comparing the
+# hashes, only the affected (player_id, year) rows are rebuilt with
+# build_panel_df(only_keys=...), and they are upserted into the panel.
+import os
+
+import pandas as pd
+
+from data_cache import CACHE_DIR, iter_table, load_table, read_frame, write_frame
+from panel_builder import (
+    APPEARANCE_COLUMNS,
+    CLUB_COLUMNS,
+    EVENT_COLUMNS,
+    LINEUP_COLUMNS,
+    PANEL_KEYS,
+    PLAYER_COLUMNS,
+    TRANSFER_COLUMNS,
+    VALUATION_COLUMNS,
+    build_panel_df,
+    clean_panel_df,
+)
+from performance_pca import FEATURES_SOURCE, save_features
+
+STATE_DIR = os.path.join(CACHE_DIR, "panel_state")
+
+# table -> (columns that feed the panel, date column giving the year)
+YEARLY_SOURCES = {
+    "appearances": (APPEARANCE_COLUMNS, "date"),
+    "player_valuations": (VALUATION_COLUMNS, "date"),
+    "transfers": (TRANSFER_COLUMNS, "transfer_date"),
+    "game_lineups": (LINEUP_COLUMNS, "date"),
+    "game_events": (EVENT_COLUMNS, "date"),
+}
+# table -> (columns that feed the panel, key column)
+STATIC_SOURCES = {
+    "players": (PLAYER_COLUMNS, "player_id"),
+    "clubs": (CLUB_COLUMNS, "club_id"),
+}
+
+
+def _row_hashes(name, columns, chunksize, data_dir, date_col=None, key_col=None):
+    """One row per source row: 64-bit hash of `columns` plus the panel keys it affects."""
+    parts = []
+    for chunk in iter_table(name, chunksize, columns, data_dir):
+        part = pd.DataFrame({"hash": pd.util.hash_pandas_object(chunk[columns], index=False).to_numpy()})
+        if date_col is not None:
+            part["player_id"] = chunk["player_id"].to_numpy()
+            part["year"] = chunk[date_col].dt.year.to_numpy()
+        else:
+            part[key_col] = chunk[key_col].to_numpy()
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def _changed_keys(old, new):
+    """Keys of rows that were added, changed or removed (compared as multisets of hashes)."""
+    counts = pd.concat([old.value_counts(), new.value_counts()], axis=1).fillna(0)
+    changed = counts[counts.iloc[:, 0] != counts.iloc[:, 1]].index.to_frame(index=False)
+    return changed.drop(columns="hash").drop_duplicates()
+
+
+def _state_path(data_dir, name):
+    state_dir = os.path.join(data_dir, STATE_DIR)
+    for ext in (".parquet", ".pkl"):
+        path = os.path.join(state_dir, name + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _current_state(chunksize, data_dir):
+    state = {}
+    for name, (columns, date_col) in YEARLY_SOURCES.items():
+        state[name] = _row_hashes(name, columns, chunksize, data_dir, date_col=date_col)
+    for name, (columns, key_col) in STATIC_SOURCES.items():
+        state[name] = _row_hashes(name, columns, chunksize, data_dir, key_col=key_col)
+    return state
+
+
+def _save_state(state, data_dir):
+    state_dir = os.path.join(data_dir, STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    for name, hashes in state.items():
+        write_frame(hashes, state_dir, name)
+
+
+def _affected_keys(state, panel_df, data_dir):
+    """(player_id, year) MultiIndex of panel rows touched by the source changes, or None if there is no saved state."""
+    changed = []
+    for name in YEARLY_SOURCES:
+        path = _state_path(data_dir, name)
+        if path is None:
+            return None
+        changed.append(_changed_keys(read_frame(path), state[name]))
+    for name, (_, key_col) in STATIC_SOURCES.items():
+        path = _state_path(data_dir, name)
+        if path is None:
+            return None
+        ids = _changed_keys(read_frame(path), state[name])[key_col]
+        # a changed player / club affects every existing panel row that refers to it
+        changed.append(panel_df.loc[panel_df[key_col].isin(ids), PANEL_KEYS])
+
+    keys = pd.concat(changed, ignore_index=True).dropna().drop_duplicates()
+    return pd.MultiIndex.from_frame(keys.astype({"player_id": "int64", "year": "int64"}))
+
+
+def update_panel(panel_path="panel_df.csv", cleaned_path="panel_df_cleaned.csv", chunksize=None, data_dir="."):
+    """
+    Bring panel_df.csv and panel_df_cleaned.csv up to date with the source tables.
+
+    The first run (no saved state or no panel yet) builds the full panel. Later
+    runs rebuild only the player-years whose source rows changed. Returns the
+    number of rebuilt player-years (None for a full build).
+    """
+    state = _current_state(chunksize, data_dir)
+    panel_file = os.path.join(data_dir, panel_path)
+
+    affected = None
+    if os.path.exists(panel_file):
+        panel_df = load_table(os.path.splitext(panel_path)[0], data_dir=data_dir)
+        panel_df["date_of_birth"] = pd.to_datetime(panel_df["date_of_birth"])
+        affected = _affected_keys(state, panel_df, data_dir)
+
+    if affected is None:
+        panel_df = build_panel_df(chunksize=chunksize, data_dir=data_dir)
+    elif len(affected):
+        updated = build_panel_df(chunksize=chunksize, data_dir=data_dir, only_keys=affected)
+        old_keys = pd.MultiIndex.from_frame(panel_df[PANEL_KEYS])
+        panel_df = pd.concat([panel_df[~old_keys.isin(affected)], updated], ignore_index=True)
+        # same row order as a full build: by (player_id, year), transfers within a player-year in file order
+        panel_df = panel_df.sort_values(PANEL_KEYS, kind="stable", ignore_index=True)
+
+    if affected is None or len(affected):
+        panel_df.to_csv(panel_file, index=False)
+        panel_df_cleaned, _ = clean_panel_df(panel_df)
+        panel_df_cleaned.to_csv(os.path.join(data_dir, cleaned_path), index=False)
+        if cleaned_path == FEATURES_SOURCE:
+            save_features(panel_df_cleaned, data_dir=data_dir)  # the PCA feature block of the cleaning stage
+    _save_state(state, data_dir)
+
+    return None if affected is None else len(affected)
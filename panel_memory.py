@@ -0,0 +1,58 @@
+# Memory footprint of the player-year panel
+#
+#   python panel_memory.py                          # panel_with_all_pca
+#   python panel_memory.py panel_df_cleaned --float32
+#
+# Compares the panel as pd.read_csv returns it (int64 / float64 / object
+# columns and one block of mostly-NaN score columns per position group) with
+# the compact layout: the PANEL_SCHEMA dtypes that data_cache.load_table
+# applies, plus the group scores stacked into one block
+# (performance_pca.stack_group_scores). With --float32 the PCA scores are
+# also stored as float32 (not lossless; the pipeline keeps float64).
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from data_cache import PANEL_SCHEMA, apply_schema
+from performance_pca import POSITION_GROUPS, stack_group_scores
+
+
+def compact_panel(df, float32=False):
+    """df with the PANEL_SCHEMA dtypes and the per-group PCA scores stacked."""
+    df = apply_schema(df.copy(), PANEL_SCHEMA)
+    if any(f"{group}_composite_score" in df.columns for group in POSITION_GROUPS):
+        df = stack_group_scores(df)
+    if float32:
+        scores = [c for c in df.columns if c.startswith(("performance_score", "position_PC"))
+                  or c.endswith("_composite_score")]
+        df[scores] = df[scores].astype(np.float32)
+    return df
+
+
+def memory_report(before, after):
+    """Bytes per dtype (deep, without the index) before and after, plus the totals."""
+    def by_dtype(df):
+        usage = df.memory_usage(deep=True, index=False)
+        return usage.groupby(df.dtypes.astype(str).to_numpy()).sum()
+
+    report = pd.DataFrame({"before": by_dtype(before), "after": by_dtype(after)}).fillna(0).astype(np.int64)
+    report.loc["total"] = report.sum()
+    report["before_mb"] = report["before"] / 1e6
+    report["after_mb"] = report["after"] / 1e6
+    return report[["before_mb", "after_mb"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory of the panel before/after the compact layout.")
+    parser.add_argument("table", nargs="?", default="panel_with_all_pca")
+    parser.add_argument("--float32", action="store_true", help="also store the PCA scores as float32")
+    args = parser.parse_args()
+
+    raw = pd.read_csv(f"{args.table}.csv", float_precision="round_trip")
+    compact = compact_panel(raw, args.float32)
+    report = memory_report(raw, compact)
+    print(f"{args.table}: {len(raw):,} rows, {raw.shape[1]} -> {compact.shape[1]} columns")
+    print(report.round(2).to_string())
+    total = report.loc["total"]
+    print(f"reduction: {total['before_mb'] / total['after_mb']:.2f}x")
@@ -0,0 +1,191 @@
+# Indexed, memory-mapped store of the player-year panel
+#
+# Looking up one player, club or position used to mean loading and scanning
+# the whole panel CSV. build_store() writes the compact panel (data_cache's
+# PANEL_SCHEMA, group scores stacked) once under .cache/panel_store/<table>:
+# one .npy file per column, sorted by the primary index (player_id, year),
+# plus secondary indexes on (club_id, year) and (position, year) and a JSON
+# sidecar with the columns, categories and source state. PanelStore opens
+# the files memory-mapped, so a lookup is a binary search plus a read of the
+# matching rows:
+#
+#   from panel_store import get_player_history, club_season
+#   get_player_history(395)
+#   club_season(518, 2020)
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_cache import CACHE_DIR, atomic_path, load_table, write_json
+from design_matrix import modules_key, sources_state
+from performance_pca import POSITION_GROUPS, stack_group_scores
+
+DEFAULT_TABLE = "panel_with_all_pca"
+
+# secondary index name -> key column (each index is sorted by (key, year))
+INDEXES = {"club": "club_id", "position": "position"}
+
+# Modules whose code produces the stored columns (part of the store's key): the
+# store layout, the typed schema (data_cache.PANEL_SCHEMA), the stacked group
+# scores and the panel builders
+STORE_MODULES = ["panel_store.py", "data_cache.py", "performance_pca.py", "panel_builder.py", "cubes.py", "asof.py",
+                 "features.py"]
+
+
+def _key():
+    return modules_key(STORE_MODULES)
+
+
+def _save(path, array):
+    with atomic_path(path) as tmp_path:
+        np.save(tmp_path, array)
+
+
+def build_store(table=DEFAULT_TABLE, data_dir="."):
+    """Write the store of <table>.csv and return its directory."""
+    df = load_table(table, data_dir=data_dir)
+    if any(f"{group}_composite_score" in df.columns for group in POSITION_GROUPS):
+        df = stack_group_scores(df)
+
+    # primary index: stable, so rows of the same player-year keep their file order
+    order = np.lexsort((df["year"].to_numpy(), df["player_id"].to_numpy()))
+    df = df.iloc[order].reset_index(drop=True)
+
+    path = os.path.join(data_dir, CACHE_DIR, "panel_store", table)
+    os.makedirs(path, exist_ok=True)
+    columns, categories = [], {}
+    for col in df.columns:
+        values = df[col]
+        if not (pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values)
+                or pd.api.types.is_datetime64_dtype(values)):
+            values = values.astype("category")
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories[col] = [str(c) for c in values.cat.categories]
+            values = values.cat.codes
+        _save(os.path.join(path, f"col.{col}.npy"), values.to_numpy())
+        columns.append(col)
+    _save(os.path.join(path, "row.npy"), order)  # row of each stored row in the CSV
+
+    year = df["year"].to_numpy()
+    for name, col in INDEXES.items():
+        keys = df[col].cat.codes.to_numpy() if col in categories else df[col].to_numpy()
+        index = np.lexsort((year, keys))
+        _save(os.path.join(path, f"index.{name}.npy"), index)
+        _save(os.path.join(path, f"index.{name}.keys.npy"), keys[index])
+        _save(os.path.join(path, f"index.{name}.years.npy"), year[index])
+
+    sidecar = {"columns": columns, "categories": categories, "rows": len(df),
+               "sources": sources_state([os.path.join(data_dir, f"{table}.csv")]), "key": _key()}
+    write_json(os.path.join(path, "store.json"), sidecar, indent=1)  # written last: marks the store as complete
+    return path
+
+
+def _span(keys, years, key, year=None):
+    """Slice of the (key, year)-sorted arrays holding `key` (and `year`)."""
+    lo, hi = np.searchsorted(keys, key, "left"), np.searchsorted(keys, key, "right")
+    if year is not None:
+        lo, hi = lo + np.searchsorted(years[lo:hi], year, "left"), lo + np.searchsorted(years[lo:hi], year, "right")
+    return slice(lo, hi)
+
+
+class PanelStore:
+    """Memory-mapped panel store written by build_store()."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "store.json")) as f:
+            self.meta = json.load(f)
+        self.columns = self.meta["columns"]
+        self.categories = self.meta["categories"]
+        self._arrays = {}
+
+    @classmethod
+    def open(cls, table=DEFAULT_TABLE, data_dir="."):
+        """The store of <table>.csv, (re)built first when missing or out of date."""
+        path = os.path.join(data_dir, CACHE_DIR, "panel_store", table)
+        try:
+            store = cls(path)
+            if (store.meta["key"] == _key()
+                    and store.meta["sources"] == sources_state([os.path.join(data_dir, f"{table}.csv")])):
+                return store
+        except (OSError, ValueError, KeyError):
+            pass
+        return cls(build_store(table, data_dir))
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def _array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    def column(self, col):
+        """Raw values of a column in store order (codes for categorical columns)."""
+        return self._array(f"col.{col}")
+
+    def take(self, rows, columns=None):
+        """DataFrame of the stored rows `rows` (a slice or positions), categoricals decoded."""
+        frame = {}
+        for col in columns or self.columns:
+            values = np.asarray(self.column(col)[rows])
+            if col in self.categories:
+                values = pd.Categorical.from_codes(values, categories=self.categories[col])
+            frame[col] = values
+        return pd.DataFrame(frame)
+
+    def _index_rows(self, name, key, year=None):
+        keys = self._array(f"index.{name}.keys")
+        if INDEXES[name] in self.categories:
+            labels = self.categories[INDEXES[name]]
+            if key not in labels:
+                return np.empty(0, dtype=np.int64)
+            key = labels.index(key)
+        rows = self._array(f"index.{name}")[_span(keys, self._array(f"index.{name}.years"), key, year)]
+        return np.sort(rows)  # store order, i.e. by (player_id, year)
+
+    # ==============Lookups==============
+    def get_player_history(self, player_id, columns=None):
+        """All panel rows of one player, by year."""
+        return self.take(_span(self.column("player_id"), self.column("year"), player_id), columns)
+
+    def player_season(self, player_id, year, columns=None):
+        """The panel row(s) of one player-year."""
+        return self.take(_span(self.column("player_id"), self.column("year"), player_id, year), columns)
+
+    def club_season(self, club_id, year=None, columns=None):
+        """Rows of the players of one club (in one year), by player and year."""
+        return self.take(self._index_rows("club", club_id, year), columns)
+
+    def position_rows(self, position, year=None, columns=None):
+        """Rows with one position (in one year), by player and year."""
+        return self.take(self._index_rows("position", position, year), columns)
+
+    def position_counts(self):
+        """Number of rows per position, from the position index alone."""
+        keys = self._array("index.position.keys")
+        labels = self.categories.get("position")
+        codes, counts = np.unique(keys, return_counts=True)
+        names = [labels[c] if c >= 0 else None for c in codes] if labels else codes
+        return pd.Series(counts, index=names, name="count").sort_values(ascending=False, kind="stable")
+
+
+# Stores opened by the module-level functions, per (table, data_dir)
+_stores = {}
+
+
+def open_store(table=DEFAULT_TABLE, data_dir="."):
+    """PanelStore.open(), reused across calls in the same process."""
+    if (table, data_dir) not in _stores:
+        _stores[table, data_dir] = PanelStore.open(table, data_dir)
+    return _stores[table, data_dir]
+
+
+def get_player_history(player_id, columns=None, table=DEFAULT_TABLE, data_dir="."):
+    return open_store(table, data_dir).get_player_history(player_id, columns)
+
+
+def club_season(club_id, year=None, columns=None, table=DEFAULT_TABLE, data_dir="."):
+    return open_store(table, data_dir).club_season(club_id, year, columns)
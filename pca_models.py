@@ -0,0 +1,169 @@
+# Persisted PCA models and fast scoring of new player-seasons
+#
+# A model holds everything needed to reproduce the scores of main_pca.py /
+# position_pca.py without refitting: the StandardScaler means/scales, the
+# PCA mean, components and explained variance, and the composite weights.
+# Models are saved as models/<name>-v<version>.npz; every save with changed
+# parameters gets the next version number.
+import glob
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_cache import atomic_path
+from performance_pca import feature_matrix
+
+MODEL_DIR = "models"
+
+# Bump if the layout of the saved files changes
+FORMAT_VERSION = 1
+
+
+def model_from_fit(scaler, pca, features, n_samples=None):
+    """Model dict from a fitted StandardScaler + PCA (as returned by performance_pca.fit_pca)."""
+    return {
+        "features": list(features),
+        "mean": scaler.mean_,
+        "scale": scaler.scale_,
+        "pca_mean": pca.mean_,
+        "components": pca.components_,
+        "explained_variance": pca.explained_variance_,
+        "composite_weights": pca.explained_variance_ratio_,
+        "n_samples": n_samples if n_samples is not None else int(np.max(scaler.n_samples_seen_)),
+    }
+
+
+def model_from_group_result(result, features):
+    """Model dict from one group of performance_pca.fit_group_pcas()."""
+    return {
+        "features": list(features),
+        "mean": result["mean"],
+        "scale": result["scale"],
+        "pca_mean": result["pca_mean"],
+        "components": result["loadings"],
+        "explained_variance": result["explained_variance"],
+        "composite_weights": result["explained_variance_ratio"],
+        "n_samples": len(result["rows"]),
+    }
+
+
+_ARRAYS = ["mean", "scale", "pca_mean", "components", "explained_variance", "composite_weights"]
+
+
+def _versions(name, model_dir):
+    versions = {}
+    for path in glob.glob(os.path.join(model_dir, f"{glob.escape(name)}-v*.npz")):
+        match = re.fullmatch(re.escape(name) + r"-v(\d+)\.npz", os.path.basename(path))
+        if match:
+            versions[int(match.group(1))] = path
+    return versions
+
+
+def load_model(name, version=None, model_dir=MODEL_DIR):
+    """Load a saved model (latest version by default)."""
+    versions = _versions(name, model_dir)
+    if not versions:
+        raise FileNotFoundError(f"no saved model '{name}' in {model_dir}/")
+    if version is None:
+        version = max(versions)
+    with np.load(versions[version], allow_pickle=False) as data:
+        model = {key: data[key] for key in _ARRAYS}
+        meta = json.loads(str(data["meta"]))
+    model.update(meta)
+    return model
+
+
+def save_model(model, name, model_dir=MODEL_DIR, source=None):
+    """
+    Save model as the next version of `name` and return the version number.
+    source optionally identifies the data it was fitted on (e.g.
+    data_cache.table_sha256("panel_df_cleaned")). If the latest saved version
+    has exactly the same parameters and source, nothing is written and its
+    version is returned.
+    """
+    versions = _versions(name, model_dir)
+    if versions:
+        latest = load_model(name, model_dir=model_dir)
+        if latest["features"] == list(model["features"]) and latest.get("source") == source and all(
+            np.array_equal(latest[key], model[key]) for key in _ARRAYS
+        ):
+            return latest["version"]
+
+    version = max(versions, default=0) + 1
+    meta = {
+        "name": name,
+        "version": version,
+        "format_version": FORMAT_VERSION,
+        "features": list(model["features"]),
+        "n_samples": int(model["n_samples"]) if model.get("n_samples") is not None else None,
+        "source": source,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, f"{name}-v{version:03d}.npz")
+    with atomic_path(path) as tmp_path:
+        np.savez(tmp_path, meta=json.dumps(meta), **{key: np.asarray(model[key]) for key in _ARRAYS})
+    return version
+
+
+class PCAScorer:
+    """
+    Scores rows with a saved model in a single matrix multiply.
+
+    ((x - mean) / scale - pca_mean) @ components.T and the composite score are
+    folded into one (n_features x n_components+1) matrix plus an offset, so
+    score() is X @ W - b.
+    """
+
+    def __init__(self, model):
+        self.features = list(model["features"])
+        components = np.asarray(model["components"], dtype=np.float64)
+        scale = np.asarray(model["scale"], dtype=np.float64)
+        projection = components.T / scale[:, None]
+        offset = (np.asarray(model["mean"]) / scale + np.asarray(model["pca_mean"])) @ components.T
+        weights = np.asarray(model["composite_weights"], dtype=np.float64)
+        self.n_components = components.shape[0]
+        self.W = np.ascontiguousarray(np.column_stack([projection, projection @ weights]))
+        self.b = np.append(offset, offset @ weights)
+
+    @classmethod
+    def load(cls, name, version=None, model_dir=MODEL_DIR):
+        return cls(load_model(name, version, model_dir))
+
+    def score(self, X):
+        """PC1..PCk and composite score for an (n_rows x n_features) array; shape (n_rows, k+1)."""
+        return np.asarray(X, dtype=np.float64) @ self.W - self.b
+
+    def score_frame(self, df, prefix="PC", composite="composite_score"):
+        """Same as score() for a DataFrame with the model's feature columns (missing values count as 0)."""
+        scores = self.score(feature_matrix(df, self.features).to_numpy(dtype=np.float64))
+        columns = [f"{prefix}{i+1}" for i in range(self.n_components)] + [composite]
+        return pd.DataFrame(scores, index=df.index, columns=columns)
+
+
+def component_drift(model, reference):
+    """
+    How far model's components are from reference's (e.g. a streaming fit vs. the batch fit).
+
+    Per component: the angle in degrees between the two loading vectors
+    (ignoring sign), the largest absolute loading difference after sign
+    alignment, and the difference in explained variance ratio (composite weight).
+    """
+    a = np.asarray(model["components"])
+    b = np.asarray(reference["components"])
+    k = min(len(a), len(b))
+    rows = []
+    for i in range(k):
+        cos = abs(a[i] @ b[i]) / (np.linalg.norm(a[i]) * np.linalg.norm(b[i]))
+        sign = 1.0 if a[i] @ b[i] >= 0 else -1.0
+        rows.append({
+            "component": f"PC{i+1}",
+            "angle_deg": float(np.degrees(np.arccos(min(cos, 1.0)))),
+            "max_abs_loading_diff": float(np.max(np.abs(sign * a[i] - b[i]))),
+            "weight_diff": float(model["composite_weights"][i] - reference["composite_weights"][i]),
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,342 @@
+# Shared configuration and fitting code for the performance PCAs
+#
+# Importing this module has no side effects (no data is loaded, nothing is
+# written) and scikit-learn is only imported when a PCA is actually fitted,
+# so scripts can use the feature lists and position groups cheaply.
+import os
+
+import numpy as np
+import pandas as pd
+
+from design_matrix import DesignMatrix, sources_state
+from shared_arrays import attach, shared_array
+
+# Select performance-related features for PCA
+PCA_FEATURES = [
+    "minutes_played", "goals", "assists",
+    "yellow_cards", "red_cards", "appearances",
+    "goals_per_90", "assists_per_90",
+    "starts", "subs"
+]
+
+N_COMPONENTS = 5
+
+# ========== Position groups (by sub_position) ==========
+POSITION_GROUPS = {
+    "Attackers": ["Centre-Forward", "Right Winger", "Left Winger", "Second Striker"],
+    "Midfielders": ["Attacking Midfield", "Central Midfield", "Defensive Midfield", "Right Midfield", "Left Midfield"],
+    "Defenders": ["Centre-Back", "Right-Back", "Left-Back"],
+    "Goalkeepers": ["Keeper", "Goalkeeper"]
+}
+
+# Groups with fewer rows than this are not fitted
+MIN_GROUP_SIZE = 50
+
+# Feature block written next to panel_df_cleaned.csv by the cleaning stage
+FEATURES_PATH = "panel_features"
+FEATURES_SOURCE = "panel_df_cleaned.csv"
+ROW_KEYS = ["player_id", "year"]
+
+
+def feature_matrix(df, features=PCA_FEATURES):
+    # Replace missing values with 0 (interpreted as 'no performance')
+    return df[features].fillna(0)
+
+
+def save_features(df, path=FEATURES_PATH, features=PCA_FEATURES, dtype=np.float64, data_dir="."):
+    """
+    Write feature_matrix(df) as a design_matrix.DesignMatrix: one column-major
+    float array (values.npy) plus a sidecar with the columns and the
+    (player_id, year) row index. Called right after panel_df_cleaned.csv is
+    written, whose state is recorded to detect a stale block.
+    """
+    design = DesignMatrix.from_frame(pd.concat([feature_matrix(df, features), df[ROW_KEYS]], axis=1),
+                                     dtype=dtype, index=ROW_KEYS)
+    design.save(os.path.join(data_dir, path), {"source": sources_state([os.path.join(data_dir, FEATURES_SOURCE)])})
+    return design
+
+
+def load_features(df, path=FEATURES_PATH, features=PCA_FEATURES, data_dir="."):
+    """
+    The feature block of df's rows as a DesignMatrix: the saved one, memory-
+    mapped (zero-copy), when it is up to date with panel_df_cleaned.csv and
+    has df's (player_id, year) rows in df's order; built from df otherwise.
+    """
+    try:
+        design, meta = DesignMatrix.load(os.path.join(data_dir, path))
+        if (meta["source"] == sources_state([os.path.join(data_dir, FEATURES_SOURCE)])
+                and set(features) <= set(design.columns) and len(design) == len(df)
+                and all(np.array_equal(design.index[k].to_numpy(), df[k].to_numpy()) for k in ROW_KEYS)):
+            return design
+    except (OSError, ValueError, KeyError):
+        pass
+    return DesignMatrix.from_frame(feature_matrix(df, features))
+
+
+def fit_pca(X, n_components=N_COMPONENTS):
+    """
+    Standardize X and fit a PCA on it.
+
+    Returns (scaler, pca, components) where components are the PC scores of X.
+    """
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
+
+    # Standardize the data (important for PCA)
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    pca = PCA(n_components=n_components)
+    components = pca.fit_transform(X_scaled)
+    return scaler, pca, components
+
+
+def composite_score(components, weights):
+    """Explained-variance-weighted sum of the PC scores."""
+    composite = np.zeros(len(components))
+    for i in range(len(weights)):
+        composite += weights[i] * components[:, i]
+    return composite
+
+
+def weighted_loadings(pca):
+    """Explained-variance-weighted sum of the component loadings (one value per feature)."""
+    weights = pca.explained_variance_ratio_
+    loadings = np.zeros(pca.components_.shape[1])
+    for i in range(len(weights)):
+        loadings += weights[i] * pca.components_[i]
+    return loadings
+
+
+# ========== Per-group PCAs (optionally in parallel) ==========
+def position_group_labels(positions, groups=POSITION_GROUPS):
+    """Group name for each row's position (NaN for positions outside every group)."""
+    lookup = {pos: name for name, members in groups.items() for pos in members}
+    return positions.map(lookup)
+
+
+def _fit_rows(X, rows, n_components):
+    # column-major like np.asarray(DataFrame), so the fit matches the per-DataFrame fit bit for bit
+    scaler, pca, components = fit_pca(np.asfortranarray(X[rows]), n_components=n_components)
+    return {
+        "rows": rows,
+        "components": components,
+        "composite": composite_score(components, pca.explained_variance_ratio_),
+        "mean": scaler.mean_,
+        "scale": scaler.scale_,
+        "pca_mean": pca.mean_,
+        "loadings": pca.components_,
+        "explained_variance": pca.explained_variance_,
+        "explained_variance_ratio": pca.explained_variance_ratio_,
+    }
+
+
+# Feature matrix of the worker processes (set by _attach_shared / _attach_file in each worker)
+_shared = {}
+
+
+def _attach_shared(spec):
+    _shared["X"] = attach(spec)
+
+
+def _attach_file(path, features):
+    _shared["X"] = DesignMatrix.load(path)[0].matrix(features)
+
+
+def _fit_shared_rows(rows, n_components):
+    return _fit_rows(_shared["X"], rows, n_components)
+
+
+def fit_group_pcas(df, labels, features=PCA_FEATURES, n_components=N_COMPONENTS,
+                   min_size=MIN_GROUP_SIZE, n_jobs=1, design=None):
+    """
+    Fit one standardized PCA per group.
+
+    labels is a Series aligned with df giving each row's group (NaN: no group),
+    e.g. position_group_labels(df["position"]), df["position"] itself, or
+    league + "/" + position for finer groups. Groups with fewer than min_size
+    rows are skipped (they are missing from the result).
+
+    design is an optional DesignMatrix with the features of df's rows (e.g.
+    load_features(df)); by default the features are taken from df.
+
+    With n_jobs > 1 (None: one per CPU) the groups are fitted in worker
+    processes that read the feature matrix from shared memory (or map the
+    saved design's file themselves); only the row positions of each group are
+    sent to the workers.
+
+    Returns {group: result} in order of first appearance, where result holds
+    the row positions, PC scores, composite score and the fitted scaler/PCA
+    parameters as NumPy arrays.
+    """
+    if design is None:
+        X = np.ascontiguousarray(feature_matrix(df, features).to_numpy(dtype=np.float64))
+    else:
+        X = design.matrix(features)
+    n_components = min(len(features), n_components)
+
+    # row positions of every group (one sort instead of one scan per group)
+    codes, names = pd.factorize(labels)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+    jobs = {}
+    for code, name in enumerate(names):
+        rows = order[bounds[code]:bounds[code + 1]]
+        if len(rows) >= min_size:
+            jobs[name] = rows
+
+    if n_jobs == 1 or len(jobs) <= 1:
+        return {name: _fit_rows(X, rows, n_components) for name, rows in jobs.items()}
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    if design is not None and design.path is not None:
+        # memory-mapped: every worker maps the same file (one copy in the page cache)
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_file,
+                                 initargs=(design.path, list(features))) as pool:
+            futures = {name: pool.submit(_fit_shared_rows, rows, n_components) for name, rows in jobs.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    with shared_array(X) as spec, ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_shared,
+                                                      initargs=(spec,)) as pool:
+        futures = {name: pool.submit(_fit_shared_rows, rows, n_components) for name, rows in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def group_score_columns(results, index, groups=None):
+    """
+    Scatter the per-group PC scores into one block of full-panel columns.
+
+    For every group (in the order of `groups`, default: results order) the
+    columns f"{group}_PC1".. and f"{group}_composite_score" are preallocated
+    with NaN and filled at the group's row positions, so no join on
+    (player_id, year) is needed. Returns a DataFrame aligned with `index`.
+    """
+    columns = {}
+    for name in (groups if groups is not None else results):
+        if name not in results:
+            continue
+        result = results[name]
+        rows = result["rows"]
+        for i in range(result["components"].shape[1]):
+            col = np.full(len(index), np.nan)
+            col[rows] = result["components"][:, i]
+            columns[f"{name}_PC{i+1}"] = col
+        col = np.full(len(index), np.nan)
+        col[rows] = result["composite"]
+        columns[f"{name}_composite_score"] = col
+    return pd.DataFrame(columns, index=index)
+
+
+def stack_group_scores(df, groups=POSITION_GROUPS, prefix="position"):
+    """
+    Compact form of the group_score_columns() block of a panel.
+
+    The f"{group}_PC1".. / f"{group}_composite_score" columns of all groups
+    (NaN outside each group's rows) are replaced by one block: "pca_group",
+    the categorical group whose scores a row holds, and f"{prefix}_PC1"..,
+    f"{prefix}_composite_score". Lossless because a row belongs to at most one
+    group; unstack_group_scores() restores the wide layout.
+    """
+    groups = [g for g in groups if f"{g}_composite_score" in df.columns]
+    suffixes = [c[len(groups[0]) + 1:] for c in df.columns if groups and c.startswith(f"{groups[0]}_PC")]
+    suffixes.append("composite_score")
+
+    codes = np.full(len(df), -1, dtype=np.int8)
+    for code, group in enumerate(groups):
+        rows = df[f"{group}_composite_score"].notna().to_numpy()
+        if (codes[rows] >= 0).any():
+            raise ValueError(f"rows with scores of more than one group ({group})")
+        codes[rows] = code
+
+    block = {"pca_group": pd.Categorical.from_codes(codes, categories=groups)}
+    for suffix in suffixes:
+        values = np.full(len(df), np.nan)
+        for code, group in enumerate(groups):
+            rows = codes == code
+            values[rows] = df[f"{group}_{suffix}"].to_numpy()[rows]
+        block[f"{prefix}_{suffix}"] = values
+    wide = [f"{group}_{suffix}" for group in groups for suffix in suffixes]
+    return pd.concat([df.drop(columns=wide), pd.DataFrame(block, index=df.index)], axis=1)
+
+
+def unstack_group_scores(df, prefix="position"):
+    """Inverse of stack_group_scores(): the wide per-group columns, in their original order."""
+    suffixes = [c[len(prefix) + 1:] for c in df.columns
+                if c.startswith(f"{prefix}_PC") or c == f"{prefix}_composite_score"]
+    columns = {}
+    for group in df["pca_group"].cat.categories:
+        rows = (df["pca_group"] == group).to_numpy()
+        for suffix in suffixes:
+            values = np.full(len(df), np.nan)
+            values[rows] = df[f"{prefix}_{suffix}"].to_numpy()[rows]
+            columns[f"{group}_{suffix}"] = values
+    block = ["pca_group"] + [f"{prefix}_{suffix}" for suffix in suffixes]
+    return pd.concat([df.drop(columns=block), pd.DataFrame(columns, index=df.index)], axis=1)
+
+
+# ========== Out-of-core PCA (chunk by chunk) ==========
+class RunningMoments:
+    """
+    Running count, mean and co-moment matrix sum((x - mean)(x - mean)^T) of
+    the rows seen so far, merged chunk by chunk (Chan et al.), so the exact
+    covariance is available without holding the data in memory.
+    """
+
+    def __init__(self, n_features):
+        self.n = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros((n_features, n_features))
+
+    def update(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        n_b = len(X)
+        if n_b == 0:
+            return
+        mean_b = X.mean(axis=0)
+        centered = X - mean_b
+        m2_b = centered.T @ centered
+
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * (n_b / n)
+        self.m2 = self.m2 + m2_b + np.outer(delta, delta) * (self.n * n_b / n)
+        self.n = n
+
+
+def fit_streaming_pca(chunks, features=PCA_FEATURES, n_components=N_COMPONENTS):
+    """
+    Standardized PCA from an iterable of DataFrame chunks in one pass.
+
+    Equivalent to fit_pca() on the concatenated chunks (same StandardScaler
+    and sign convention), but only one chunk plus a features x features
+    matrix is in memory. Returns a model dict as used by pca_models.
+    """
+    moments = RunningMoments(len(features))
+    for chunk in chunks:
+        moments.update(feature_matrix(chunk, features).to_numpy(dtype=np.float64))
+
+    # StandardScaler: population std, zero variance -> scale 1
+    scale = np.sqrt(np.diag(moments.m2) / moments.n)
+    scale[scale == 0] = 1.0
+    # covariance (ddof=1, like PCA) of the standardized features
+    cov = moments.m2 / np.outer(scale, scale) / (moments.n - 1)
+
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues = np.clip(eigenvalues[order], 0, None)
+    components = eigenvectors[:, order].T
+    # same sign convention as scikit-learn: largest |loading| of each component is positive
+    signs = np.sign(components[np.arange(len(components)), np.argmax(np.abs(components), axis=1)])
+    components = components * signs[:, None]
+
+    return {
+        "features": list(features),
+        "mean": moments.mean,
+        "scale": scale,
+        "pca_mean": np.zeros(len(features)),
+        "components": components[:n_components],
+        "explained_variance": eigenvalues[:n_components],
+        "composite_weights": eigenvalues[:n_components] / eigenvalues.sum(),
+        "n_samples": moments.n,
+    }
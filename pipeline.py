@@ -0,0 +1,284 @@
+# Pipeline runner for the whole analysis
+#
+#   python pipeline.py                 # run every stage that is out of date
+#   python pipeline.py lr vif          # only these stages (and what they depend on)
+#   python pipeline.py --force pca     # rerun even if up to date
+#   python pipeline.py -j 4 --param PANEL_CHUNKSIZE=1000000
+#
+# Each stage is one of the existing scripts. A stage is skipped when the
+# hash of its input files, its code (the script and the local modules it
+# imports) and its parameters matches the previous run and its outputs are
+# unchanged. Stages whose inputs are ready run concurrently (e.g. VIF, the
+# regression grid and lr.py after position_pca).
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_DIR = os.path.join(".cache", "pipeline")
+
+RAW_TABLES = ["appearances.csv", "player_valuations.csv", "transfers.csv", "players.csv",
+              "game_lineups.csv", "game_events.csv", "clubs.csv"]
+POSITION_GROUPS = ["Attackers", "Midfielders", "Defenders", "Goalkeepers"]
+# PCA feature block written by the cleaning stage (performance_pca.save_features)
+FEATURE_FILES = [f"panel_features/{name}" for name in ("values.npy", "finite.npy", "index.npy", "design.json")]
+LR_OUTPUTS = ["market_value_regression_coefficients.csv", "market_value_regression_coefficients_with_year.csv",
+              "transfer_fee_regression_coefficients.csv", "transfer_fee_regression_coefficients_with_year.csv"]
+
+# stage -> script, input files, output files, environment parameters that affect the result
+# (dependencies between stages follow from which stage produces which input)
+STAGES = {
+    "panel": {
+        "script": "create_panel_df.py",
+        "inputs": RAW_TABLES,
+        "outputs": ["panel_df.csv"],
+        "params": ["PANEL_CHUNKSIZE", "PANEL_VALUATION_AT", "PANEL_TRANSFER_AT", "PANEL_BUCKETING",
+                   "PANEL_INCREMENTAL"],
+    },
+    "cleaned": {
+        "script": "create_panel_df_cleaned.py",
+        "inputs": ["panel_df.csv"],
+        "outputs": ["panel_df_cleaned.csv"] + FEATURE_FILES,
+    },
+    "pca": {
+        "script": "main_pca.py",
+        "inputs": ["panel_df_cleaned.csv"] + FEATURE_FILES,
+        "outputs": ["panel_with_pca.csv"],
+        "params": ["PCA_CHUNKSIZE"],
+    },
+    "position_pca": {
+        "script": "position_pca.py",
+        "inputs": ["panel_with_pca.csv"] + FEATURE_FILES,
+        "outputs": ["panel_with_all_pca.csv"]
+                   + [f"pca_outputs_by_position/{g}_{kind}" for g in POSITION_GROUPS
+                      for kind in ("loadings.csv", "variance.txt")],
+    },
+    "lr": {
+        "script": "lr.py",
+        "inputs": ["panel_df_cleaned.csv", "panel_with_all_pca.csv", "clubs.csv"],
+        "outputs": LR_OUTPUTS,
+    },
+    "regression_grid": {
+        "script": "run_regression_grid.py",
+        "inputs": ["panel_df_cleaned.csv", "panel_with_all_pca.csv", "clubs.csv"],
+        "outputs": ["regression_grid_results.csv"],
+        "params": ["GRID_JOBS"],
+    },
+    "vif": {
+        "script": "VIF.py",
+        "inputs": ["panel_df_cleaned.csv", "panel_with_all_pca.csv", "clubs.csv"],
+        "outputs": ["vif_results.csv"],
+    },
+    "position_regression": {
+        "script": "lr_performance_market_value.py",
+        # after the grid: both append runs to regression_results.sqlite, so the
+        # output recorded for this stage covers the grid's run as well
+        "inputs": ["panel_with_all_pca.csv", "regression_grid_results.csv"],
+        "outputs": ["regression_results.sqlite"],
+    },
+    "regression_table": {
+        "script": "table_lr_performance_market_value.py",
+        "inputs": ["regression_results.sqlite"],
+        "outputs": [],
+    },
+    "regression_graph": {
+        "script": "regression_results_graph.py",
+        "inputs": LR_OUTPUTS,
+        "outputs": ["regression_results_summary.pdf"],
+    },
+}
+
+
+# ==============Hashing==============
+class _Digests:
+    """sha256 of files, memoized on (size, mtime) in .cache/pipeline/digests.json."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.memo = json.load(f)
+        except (OSError, ValueError):
+            self.memo = {}
+
+    def __call__(self, path):
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        entry = self.memo.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        self.memo[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": h.hexdigest()}
+        return h.hexdigest()
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump(self.memo, f, indent=1)
+
+
+def local_modules(script, root=ROOT, seen=None):
+    """The script plus every module of this repo it imports, directly or indirectly."""
+    if seen is None:
+        seen = set()
+    path = os.path.join(root, script)
+    if path in seen or not os.path.exists(path):
+        return seen
+    seen.add(path)
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            local_modules(name.split(".")[0] + ".py", root, seen)
+    return seen
+
+
+def stage_params(name, params):
+    """The stage's parameters as it runs with them: --param values, else the environment."""
+    return {p: params.get(p, os.environ.get(p)) for p in STAGES[name].get("params", [])}
+
+
+def stage_key(name, digests, params):
+    stage = STAGES[name]
+    payload = {
+        "inputs": {p: digests(p) for p in stage["inputs"]},
+        "code": {os.path.relpath(p, ROOT): digests(p) for p in sorted(local_modules(stage["script"]))},
+        "params": stage_params(name, params),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+# ==============Scheduling==============
+def dependencies():
+    producer = {out: name for name, stage in STAGES.items() for out in stage["outputs"]}
+    return {
+        name: sorted({producer[p] for p in stage["inputs"] if p in producer and producer[p] != name})
+        for name, stage in STAGES.items()
+    }
+
+
+def _with_upstream(targets, deps):
+    selected = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in selected:
+            selected.add(name)
+            todo.extend(deps[name])
+    return selected
+
+
+def _load_record(name):
+    try:
+        with open(os.path.join(STATE_DIR, f"{name}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_fresh(name, key, digests):
+    record = _load_record(name)
+    if record is None or record["key"] != key:
+        return False
+    return all(digests(p) is not None and digests(p) == record["outputs"].get(p) for p in STAGES[name]["outputs"])
+
+
+def _run_stage(name, params):
+    stage = STAGES[name]
+    env = dict(os.environ)
+    env.update({p: str(v) for p, v in stage_params(name, params).items() if v is not None})
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join(ROOT, stage["script"])],
+                          env=env, capture_output=True, text=True)
+    with open(os.path.join(STATE_DIR, f"{name}.log"), "w") as f:
+        f.write(proc.stdout)
+        f.write(proc.stderr)
+    return proc.returncode, time.perf_counter() - start
+
+
+def run(targets=None, force=(), jobs=None, params=None):
+    """Run the selected stages (all by default) and their upstream stages; returns {stage: status}."""
+    params = params or {}
+    deps = dependencies()
+    selected = _with_upstream(targets or STAGES, deps)
+    os.makedirs(STATE_DIR, exist_ok=True)
+    digests = _Digests(os.path.join(STATE_DIR, "digests.json"))
+
+    status = {}
+    running = {}  # future -> stage
+    keys = {}     # stage -> key it was started with
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        while len(status) < len(selected):
+            for name in sorted(selected):
+                if name in status or name in running.values():
+                    continue
+                if any(status.get(d) == "failed" or status.get(d) == "blocked" for d in deps[name]):
+                    status[name] = "blocked"
+                    print(f"[{name}] blocked by a failed upstream stage")
+                    continue
+                if not all(d in status or d not in selected for d in deps[name]):
+                    continue
+                key = stage_key(name, digests, params)
+                if name not in force and _is_fresh(name, key, digests):
+                    status[name] = "cached"
+                    print(f"[{name}] up to date")
+                    continue
+                print(f"[{name}] running {STAGES[name]['script']}")
+                running[pool.submit(_run_stage, name, params)] = name
+                keys[name] = key
+            if not running:
+                continue  # everything left was just resolved as cached/blocked
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                returncode, elapsed = future.result()
+                if returncode != 0:
+                    status[name] = "failed"
+                    print(f"[{name}] FAILED after {elapsed:.1f}s (see {STATE_DIR}/{name}.log)")
+                    continue
+                record = {
+                    "key": keys.pop(name),
+                    "outputs": {p: digests(p) for p in STAGES[name]["outputs"]},
+                    "seconds": elapsed,
+                }
+                with open(os.path.join(STATE_DIR, f"{name}.json"), "w") as f:
+                    json.dump(record, f, indent=2)
+                status[name] = "ran"
+                print(f"[{name}] done in {elapsed:.1f}s")
+    digests.save()
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Transfermarkt analysis pipeline.")
+    parser.add_argument("stages", nargs="*", help=f"stages to bring up to date (default: all of {', '.join(STAGES)})")
+    parser.add_argument("--force", nargs="*", default=None, help="rerun these stages (no names: all selected stages)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of stages to run at the same time")
+    parser.add_argument("--param", action="append", default=[], help="NAME=VALUE passed to the stages as environment variable")
+    args = parser.parse_args()
+
+    unknown = [s for s in args.stages + (args.force or []) if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    params = dict(p.split("=", 1) for p in args.param)
+    targets = args.stages or list(STAGES)
+    force = set(targets if args.force == [] else (args.force or []))
+    status = run(targets, force=force, jobs=args.jobs, params=params)
+    sys.exit(1 if any(s in ("failed", "blocked") for s in status.values()) else 0)
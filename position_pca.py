@@ -1,90 +1,77 @@
 import pandas as pd
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-import matplotlib.pyplot as plt
-import os
-import numpy as np
-
-# ========== Load data ==========
-df = pd.read_csv("panel_df_cleaned.csv")
-
-# ========== Define position groups ==========
-position_groups = {
-    "Attackers": ["Centre-Forward", "Right Winger", "Left Winger", "Second Striker"],
-    "Midfielders": ["Attacking Midfield", "Central Midfield", "Defensive Midfield", "Right Midfield", "Left Midfield"],
-    "Defenders": ["Centre-Back", "Right-Back", "Left-Back"],
-    "Goalkeepers": ["Keeper", "Goalkeeper"]
-}
-
-# ========== Define features ==========
-from main_pca import pca_features 
-
-# ========== Process each group ==========
-for group_name, positions in position_groups.items():
-    group_df = df[df["position"].isin(positions)].copy()
-    
-    # Skip if too few players
-    if group_df.shape[0] < 50:
-        print(f"Skipping {group_name}: too few samples")
-        continue
-
-    X = group_df[pca_features].fillna(0)
-    X_scaled = StandardScaler().fit_transform(X)
-
-    # PCA
-    pca = PCA(n_components=min(len(pca_features), 5))
-    components = pca.fit_transform(X_scaled)
-    loadings = pd.DataFrame(pca.components_.T, index=pca_features, columns=[f"PC{i+1}" for i in range(pca.n_components_)])
-    
-    # Calculate weighted composite score
-    weights = pca.explained_variance_ratio_
-    composite_score = np.zeros(len(X))
-    for i in range(pca.n_components_):
-        composite_score += weights[i] * components[:, i]
-    
-    # Add composite score to group_df
-    group_df[f"{group_name}_composite_score"] = composite_score
-    
-    # Save loadings
-    loadings.to_csv(f"pca_outputs_by_position/{group_name}_loadings.csv")
-    
-    # Save explained variance
-    with open(f"pca_outputs_by_position/{group_name}_variance.txt", "w") as f:
-        for i, v in enumerate(pca.explained_variance_ratio_):
-            f.write(f"PC{i+1}: {v:.4f}\n")
-    
-    # Add component scores to df for inspection
-    for i in range(pca.n_components_):
-        group_df[f"PC{i+1}"] = components[:, i]
-    
-    # Save the group-level PCA result
-    group_df.to_csv(f"pca_outputs_by_position/{group_name}_with_pcs.csv", index=False)
-    
-    # Print explained variance ratios for PC1~PC5
-    print(f"\n{group_name} PCA Explained Variance Ratios:")
-    for i, v in enumerate(pca.explained_variance_ratio_):
-        print(f"  PC{i+1}: {v:.4f}")
-
-    # Print component loadings for PC1~PC5
-    print(f"\n{group_name} PCA Component Loadings:")
-    print(loadings.iloc[:, :5].round(3))  # Show up to PC5, rounded for readability
-
-# Add position-specific PCs and composite scores to panel_with_pca
-combined_df = pd.read_csv("panel_with_pca.csv")
-
-for group_name in position_groups.keys():
-    pcs_path = f"pca_outputs_by_position/{group_name}_with_pcs.csv"
-    if os.path.exists(pcs_path):
-        pcs_df = pd.read_csv(pcs_path)
-        # Keep player_id, year, PCs and composite score
-        keep_cols = ["player_id", "year"] + [f"PC{i+1}" for i in range(5) if f"PC{i+1}" in pcs_df.columns]
-        if f"{group_name}_composite_score" in pcs_df.columns:
-            keep_cols.append(f"{group_name}_composite_score")
-        pcs_df = pcs_df[keep_cols]
-        # Rename PC columns to include group name
-        pcs_df = pcs_df.rename(columns={f"PC{i+1}": f"{group_name}_PC{i+1}" for i in range(5) if f"PC{i+1}" in pcs_df.columns})
-        # Merge into combined_df
-        combined_df = combined_df.merge(pcs_df, on=["player_id", "year"], how="left")
-
-combined_df.to_csv("panel_with_all_pca.csv", index=False)
-print("Saved full panel with position-specific PCs and composite scores to 'panel_with_all_pca.csv'.")
\ No newline at end of file
+
+from data_cache import load_table
+from pca_models import model_from_group_result, save_model
+# Feature and group definitions (importing this does not run the global PCA)
+from performance_pca import (PCA_FEATURES, POSITION_GROUPS, fit_group_pcas, group_score_columns, load_features,
+                             position_group_labels)
+
+# Worker processes for fitting the groups (None: one per CPU, 1: fit one after another here)
+N_JOBS = None
+
+# Also write pca_outputs_by_position/<group>_with_pcs.csv (full group rows + PCs) for inspection
+WRITE_GROUP_CSVS = False
+
+if __name__ == "__main__":  # worker processes re-import this script under the "spawn" start method
+    # ========== Load data ==========
+    # panel_with_pca.csv is panel_df_cleaned.csv (same rows, same order) plus the global scores,
+    # so it is the only input we need
+    df = load_table("panel_with_pca")
+
+    # ========== Define position groups ==========
+    position_groups = POSITION_GROUPS
+
+    # ========== Define features ==========
+    pca_features = PCA_FEATURES
+
+    # ========== Fit every group (in parallel) ==========
+    # For finer groups pass e.g. df["position"] or league/position labels instead
+    labels = position_group_labels(df["position"], position_groups)
+    # (features memory-mapped from the cleaning stage's block, mapped by the workers too)
+    results = fit_group_pcas(df, labels, pca_features, n_components=5, n_jobs=N_JOBS, design=load_features(df))
+
+    # ========== Process each group ==========
+    for group_name in position_groups.keys():
+        # Skip if too few players
+        if group_name not in results:
+            print(f"Skipping {group_name}: too few samples")
+            continue
+        result = results[group_name]
+        n_components = result["loadings"].shape[0]
+
+        loadings = pd.DataFrame(result["loadings"].T, index=pca_features, columns=[f"PC{i+1}" for i in range(n_components)])
+
+        # Save loadings
+        loadings.to_csv(f"pca_outputs_by_position/{group_name}_loadings.csv")
+
+        # Save explained variance
+        with open(f"pca_outputs_by_position/{group_name}_variance.txt", "w") as f:
+            for i, v in enumerate(result["explained_variance_ratio"]):
+                f.write(f"PC{i+1}: {v:.4f}\n")
+
+        if WRITE_GROUP_CSVS:
+            # Save the group-level PCA result with component scores for inspection
+            group_df = df.iloc[result["rows"]].copy()
+            group_df[f"{group_name}_composite_score"] = result["composite"]
+            for i in range(n_components):
+                group_df[f"PC{i+1}"] = result["components"][:, i]
+            group_df.to_csv(f"pca_outputs_by_position/{group_name}_with_pcs.csv", index=False)
+
+        # Save the fitted model for scoring new player-seasons (pca_models.PCAScorer.load(f"position_{group_name}"))
+        save_model(model_from_group_result(result, pca_features), f"position_{group_name}")
+
+        # Print explained variance ratios for PC1~PC5
+        print(f"\n{group_name} PCA Explained Variance Ratios:")
+        for i, v in enumerate(result["explained_variance_ratio"]):
+            print(f"  PC{i+1}: {v:.4f}")
+
+        # Print component loadings for PC1~PC5
+        print(f"\n{group_name} PCA Component Loadings:")
+        print(loadings.iloc[:, :5].round(3))  # Show up to PC5, rounded for readability
+
+    # Add position-specific PCs and composite scores to panel_with_pca
+    # (each group's scores are written into its own columns at the group's rows)
+    combined_df = pd.concat([df, group_score_columns(results, df.index, position_groups)], axis=1)
+
+    combined_df.to_csv("panel_with_all_pca.csv", index=False)
+    print("Saved full panel with position-specific PCs and composite scores to 'panel_with_all_pca.csv'.")
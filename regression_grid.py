@@ -0,0 +1,232 @@
+# Declarative grid of regression specifications
+#
+# The design matrix (panel + composite scores + Big5 flag + dummies + log
+# targets) is prepared and encoded once (load_design, cached under
+# .cache/design for the other regression scripts); every combination of GRID values is one
+# specification. Specifications on the same rows share one Gram matrix
+# (ols.py), and the distinct row sets are fitted in parallel worker
+# processes that read the design matrix from shared memory. The result is
+# one tidy table with a row per (specification, variable).
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from data_cache import load_table
+from design_matrix import DesignMatrix, cached_design, modules_key
+from features import TOP10_COUNTRIES, country_group
+from ols import Gram, spec_row_groups, tidy_result, vif
+from performance_pca import POSITION_GROUPS, position_group_labels, stack_group_scores
+from shared_arrays import attach, shared_array
+
+PANEL_KEYS = ["player_id", "year"]
+COMPOSITE_COLUMNS = ["performance_composite_score", "position_composite_score"]
+# Modules whose code builds the cached design (part of its cache key)
+DESIGN_MODULES = ["regression_grid.py", "features.py", "performance_pca.py", "data_cache.py", "design_matrix.py"]
+
+BIG5_IDS = ["GB1", "ES1", "IT1", "L1", "FR1"]
+
+# target -> column of the prepared design (log of the positive values, NaN otherwise)
+TARGETS = {
+    "market_value_in_eur": "log_market_value",
+    "transfer_fee": "log_transfer_fee",
+}
+
+# Non-performance controls; the foot_* and country_group_* dummies are added as found in the design
+CONTROL_FEATURES = ["age", "height_in_cm", "is_big5_league"]
+
+# feature set -> (score columns, whether the controls are included)
+FEATURE_SETS = {
+    "performance": (["performance_composite_score"], True),                                 # lr.py
+    "performance_position": (["performance_composite_score", "position_composite_score"], True),  # lr copy.py
+    "scores_only": (["performance_composite_score", "position_composite_score"], False),     # lr_performance_market_value.py
+}
+
+GRID = {
+    "target": list(TARGETS),
+    "feature_set": list(FEATURE_SETS),
+    "year": [False, True],
+    "position_group": [None] + list(POSITION_GROUPS),  # None: all players
+    "big5_only": [False, True],
+}
+
+
+def prepare_design(data_dir="."):
+    """The regression design shared by every specification (one row per panel row)."""
+    # 1. Load cleaned panel and composite scores
+    df = load_table("panel_df_cleaned", data_dir=data_dir)
+    # the per-group scores stacked: position_composite_score is the score of each row's own group
+    pca_df = stack_group_scores(load_table("panel_with_all_pca", data_dir=data_dir))
+    clubs = load_table("clubs", data_dir=data_dir)
+
+    # Merge composite scores into cleaned panel (on player_id and year)
+    df = df.merge(pca_df[PANEL_KEYS + COMPOSITE_COLUMNS], on=PANEL_KEYS, how="left")
+    df["position_group"] = position_group_labels(df["position"])
+
+    # Big5 league flag
+    df = df.merge(clubs[["club_id", "domestic_competition_id"]], on="club_id", how="left")
+    df["is_big5_league"] = df["domestic_competition_id"].isin(BIG5_IDS).astype(int)
+
+    # One-hot encode 'foot'; group country_of_citizenship into Top10/Other and one-hot encode
+    df = pd.get_dummies(df, columns=["foot"], drop_first=True)
+    df["country_group"] = country_group(df["country_of_citizenship"], TOP10_COUNTRIES)
+    df = pd.get_dummies(df, columns=["country_group"], drop_first=True)
+
+    # log targets; zero market values / non-positive transfer fees become NaN and drop out of the fits
+    df["log_market_value"] = np.log(df["market_value_in_eur"].where(df["market_value_in_eur"] > 0))
+    df["log_transfer_fee"] = np.log(df["transfer_fee"].where(df["transfer_fee"] > 0))
+    return df
+
+
+def load_design(data_dir=".", dtype=np.float64):
+    """
+    prepare_design() encoded as a design_matrix.DesignMatrix (position_group as
+    codes). Saved under .cache/design/regression and memory-mapped by later
+    calls until the input CSVs or the modules in DESIGN_MODULES change.
+    """
+    return cached_design(
+        "regression",
+        lambda: DesignMatrix.from_frame(prepare_design(data_dir), categorical=["position_group"], dtype=dtype),
+        sources=["panel_df_cleaned.csv", "panel_with_all_pca.csv", "clubs.csv"],
+        key=modules_key(DESIGN_MODULES), data_dir=data_dir, dtype=dtype,
+    )
+
+
+def feature_list(df, feature_set, year=False, big5_only=False):
+    """Regressors of one specification, in the column order the scripts report them."""
+    scores, controls = FEATURE_SETS[feature_set]
+    features = list(scores)
+    if controls:
+        features += [c for c in CONTROL_FEATURES if not (big5_only and c == "is_big5_league")]
+        features += [col for col in df.columns if col.startswith("foot_") or col.startswith("country_group_")]
+    if year:
+        features.append("year")
+    return features
+
+
+def spec_name(target, feature_set, year, position_group, big5_only):
+    return "|".join([target, feature_set, "year" if year else "no_year",
+                     position_group or "All", "big5" if big5_only else "all_leagues"])
+
+
+def expand_grid(design, grid=GRID):
+    """
+    One specification per combination of grid values (missing keys: GRID's
+    values) on a load_design() matrix: {name: spec} as used by ols.fit_batch.
+    """
+    grid = {**GRID, **grid}
+    position_groups = design.labels("position_group")
+    big5 = design["is_big5_league"] == 1
+    specs = {}
+    for target, feature_set, year, position_group, big5_only in itertools.product(
+            grid["target"], grid["feature_set"], grid["year"], grid["position_group"], grid["big5_only"]):
+        rows = np.ones(len(design), dtype=bool)
+        if position_group is not None:
+            rows &= position_groups == position_group
+        if big5_only:
+            rows &= big5
+        specs[spec_name(target, feature_set, year, position_group, big5_only)] = {
+            "target": TARGETS[target],
+            "features": feature_list(design, feature_set, year, big5_only),
+            "rows": rows,
+            "labels": {
+                "target": target,
+                "feature_set": feature_set,
+                "year": year,
+                "position_group": position_group or "All",
+                "big5_only": big5_only,
+            },
+        }
+    return specs
+
+
+# ==============Fitting==============
+def _fit_row_group(data, mask, columns, jobs):
+    """Fit the specifications of one row set; returns {name: tidy rows} (None: not estimable)."""
+    gram = Gram(data, columns, mask)
+    out = {}
+    for name, target, features in jobs:
+        # e.g. a dummy without variation inside one position group or league
+        features = [f for f in features if gram.std[gram.position[f]] > 0]
+        if gram.n - len(features) - 1 < 1 or gram.std[gram.position[target]] == 0:
+            out[name] = None
+            continue
+        try:
+            out[name] = tidy_result(gram.solve(target, features))
+        except np.linalg.LinAlgError:  # perfectly collinear regressors
+            out[name] = None
+    return out
+
+
+# Design matrix of the worker processes (set by _attach_shared in each worker)
+_shared = {}
+
+
+def _attach_shared(shared, columns):
+    _shared["data"] = DesignMatrix(attach(shared), columns)
+
+
+def _fit_shared_row_group(mask, columns, jobs):
+    return _fit_row_group(_shared["data"], mask, columns, jobs)
+
+
+def run_grid(design, specs, n_jobs=1):
+    """
+    Fit every specification and return one tidy table: the spec name and its
+    labels, then one row per variable (including "const") with raw and
+    standardized coefficients, standard errors, t and p-values, n and R².
+    Specifications that cannot be estimated on their rows are left out.
+
+    With n_jobs > 1 (None: one per CPU) the row sets are fitted in worker
+    processes that share the used columns of the design through shared memory.
+    """
+    groups = spec_row_groups(design, specs)
+    tasks = [(group["mask"], group["columns"],
+              [(name, specs[name]["target"], specs[name]["features"]) for name in group["specs"]])
+             for group in groups]
+
+    fitted = {}
+    if n_jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            fitted.update(_fit_row_group(design, *task))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        columns = list(dict.fromkeys(c for group in groups for c in group["columns"]))
+        with shared_array(design.matrix(columns), order="F") as shared, \
+                ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_shared, initargs=(shared, columns)) as pool:
+            for out in pool.map(_fit_shared_row_group, *zip(*tasks)):
+                fitted.update(out)
+
+    parts = []
+    for name, spec in specs.items():  # grid order
+        if fitted.get(name) is None:
+            continue
+        rows = fitted[name]
+        for key, value in reversed(list(spec.get("labels", {}).items())):
+            rows.insert(0, key, value)
+        rows.insert(0, "spec", name)
+        parts.append(rows)
+    return pd.concat(parts, ignore_index=True)
+
+
+def run_vif(design, specs):
+    """
+    VIFs of the regressors of every specification on the rows it is fitted
+    on, as one tidy table (spec, labels, variable, VIF). Specifications on the
+    same rows share one correlation matrix; regressors without variation on
+    those rows are left out, like in run_grid().
+    """
+    parts = []
+    for group in spec_row_groups(design, specs):
+        gram = Gram(design, group["columns"], group["mask"])
+        for name in group["specs"]:
+            features = [f for f in specs[name]["features"] if gram.std[gram.position[f]] > 0]
+            rows = vif(gram, features).reset_index()
+            rows["n"] = gram.n
+            for key, value in reversed(list(specs[name].get("labels", {}).items())):
+                rows.insert(0, key, value)
+            rows.insert(0, "spec", name)
+            parts.append(rows)
+    order = {name: i for i, name in enumerate(specs)}
+    return pd.concat(parts).sort_values("spec", key=lambda s: s.map(order), kind="stable", ignore_index=True)
@@ -0,0 +1,161 @@
+# Bootstrap and K-fold cross-validation for the standardized regressions
+#
+# A resample is a row of a weight matrix W (resamples x rows): how often each
+# row is drawn (bootstrap) or whether it is in the training part (K-fold).
+# All resamples are fitted at once: W @ P gives the moment matrices of every
+# resample, where P holds the pairwise products of [1, X, y] per row, and the
+# standardized coefficients follow from one batched solve. The cluster
+# bootstrap sums P per cluster first, so its W is resamples x clusters.
+import copy
+
+import numpy as np
+import pandas as pd
+
+# Resamples fitted per matrix product (bounds the size of W to batch_size x rows)
+BATCH_SIZE = 256
+
+
+def _design(data, target, features, rows=None):
+    """[1, X, y] on the usable rows, standardized with the full-sample mean/std (for conditioning)."""
+    values = data[list(features) + [target]].to_numpy(dtype=np.float64)
+    mask = np.isfinite(values).all(axis=1)
+    if rows is not None:
+        mask &= np.asarray(rows, dtype=bool)
+    values = values[mask]
+    std = values.std(axis=0)
+    values = (values - values.mean(axis=0)) / np.where(std == 0, 1.0, std)
+    return np.column_stack([np.ones(len(values)), values]), mask
+
+
+class _Moments:
+    """Pairwise products of the design columns per row (upper triangle), so W @ products are moments."""
+
+    def __init__(self, Z):
+        self.m = Z.shape[1]
+        self.iu = np.triu_indices(self.m)
+        self.products = Z[:, self.iu[0]] * Z[:, self.iu[1]]
+
+    def by_cluster(self, codes, n_clusters):
+        """The products summed per cluster (one row per cluster code), to be weighted per cluster."""
+        summed = copy.copy(self)
+        summed.products = np.column_stack([np.bincount(codes, weights=column, minlength=n_clusters)
+                                           for column in self.products.T])
+        return summed
+
+    def fit(self, W):
+        """Standardized coefficients, means and stds (in design units) of every weighted resample."""
+        M = np.zeros((len(W), self.m, self.m))
+        M[:, self.iu[0], self.iu[1]] = W @ self.products
+        M = M + np.triu(M, 1).transpose(0, 2, 1)
+
+        n = M[:, 0, 0]
+        mean = M[:, 0, 1:] / n[:, None]
+        cov = M[:, 1:, 1:] / n[:, None, None] - mean[:, :, None] * mean[:, None, :]
+        std = np.sqrt(np.clip(np.diagonal(cov, axis1=1, axis2=2), 0, None))
+        safe = np.where(std == 0, 1.0, std)
+        corr = cov / (safe[:, :, None] * safe[:, None, :])
+
+        R_xx, r_xy = corr[:, :-1, :-1], corr[:, :-1, -1]
+        try:
+            beta = np.linalg.solve(R_xx, r_xy[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:  # e.g. a dummy without variation in some resample
+            beta = (np.linalg.pinv(R_xx) @ r_xy[:, :, None])[:, :, 0]
+        return beta, mean, std
+
+
+def _fit_weights(moments, weights, batch_size=BATCH_SIZE):
+    parts = [moments.fit(weights[i:i + batch_size]) for i in range(0, len(weights), batch_size)]
+    return tuple(np.concatenate(p) for p in zip(*parts))
+
+
+def _cluster_codes(clusters, n):
+    if clusters is None:
+        return np.arange(n), n
+    codes, uniques = pd.factorize(np.asarray(clusters))
+    return codes, len(uniques)
+
+
+def bootstrap_weights(n_boot, n_clusters, rng):
+    """
+    Draw n_boot resamples of the clusters with replacement as an index matrix
+    (n_boot x n_clusters) and turn it into cluster weights (n_boot x
+    n_clusters): the number of times each cluster was drawn. Applied to the
+    per-cluster sums of _Moments.by_cluster(), so no resamples x rows matrix
+    is ever built.
+    """
+    draws = rng.integers(0, n_clusters, size=(n_boot, n_clusters))
+    counts = np.zeros((n_boot, n_clusters))
+    np.add.at(counts, (np.arange(n_boot)[:, None], draws), 1)
+    return counts
+
+
+def bootstrap(data, target, features, n_boot=1000, clusters=None, rows=None, seed=None):
+    """
+    Bootstrap distribution of the standardized coefficients of target ~ features.
+
+    clusters (aligned with data, e.g. data["player_id"]) resamples whole
+    clusters instead of rows, which keeps the repeated player-years of a
+    player together. rows optionally restricts the fit (boolean mask).
+    Returns a DataFrame with one row per resample and one column per feature.
+    """
+    Z, mask = _design(data, target, features, rows)
+    codes, n_clusters = _cluster_codes(None if clusters is None else np.asarray(clusters)[mask], len(Z))
+    rng = np.random.default_rng(seed)
+    moments = _Moments(Z)
+    if clusters is not None:
+        moments = moments.by_cluster(codes, n_clusters)
+
+    betas = []
+    for start in range(0, n_boot, BATCH_SIZE):
+        W = bootstrap_weights(min(BATCH_SIZE, n_boot - start), n_clusters, rng)
+        betas.append(moments.fit(W)[0])
+    return pd.DataFrame(np.concatenate(betas), columns=list(features))
+
+
+def bootstrap_ci(draws, level=0.95):
+    """Percentile confidence intervals (and bootstrap standard errors) from bootstrap() draws."""
+    alpha = (1 - level) / 2
+    return pd.DataFrame({
+        "lower": draws.quantile(alpha),
+        "upper": draws.quantile(1 - alpha),
+        "std_err": draws.std(ddof=1),
+    })
+
+
+def kfold_weights(k, codes, n_clusters, rng):
+    """Training weights (k x rows) of a K-fold split; all rows of a cluster fall into the same fold."""
+    fold_of_cluster = rng.permutation(n_clusters) % k
+    fold = fold_of_cluster[codes]
+    return (fold[None, :] != np.arange(k)[:, None]).astype(np.float64), fold
+
+
+def cross_validate(data, target, features, k=5, clusters=None, rows=None, seed=None):
+    """
+    K-fold cross-validation of target ~ features (grouped by clusters if given).
+
+    Returns one row per fold with the out-of-fold R², the number of test rows
+    and the standardized coefficients fitted on the training folds.
+    """
+    Z, mask = _design(data, target, features, rows)
+    codes, n_clusters = _cluster_codes(None if clusters is None else np.asarray(clusters)[mask], len(Z))
+    rng = np.random.default_rng(seed)
+    W, fold = kfold_weights(k, codes, n_clusters, rng)
+    beta, mean, std = _fit_weights(_Moments(Z), W)
+
+    # out-of-fold predictions in design units
+    X, y = Z[:, 1:-1], Z[:, -1]
+    coef = beta * std[:, -1:] / np.where(std[:, :-1] == 0, 1.0, std[:, :-1])
+    intercept = mean[:, -1] - np.einsum("kp,kp->k", coef, mean[:, :-1])
+    r2 = np.empty(k)
+    n_test = np.empty(k, dtype=np.int64)
+    for i in range(k):
+        test = fold == i
+        resid = y[test] - (intercept[i] + X[test] @ coef[i])
+        r2[i] = 1 - (resid ** 2).sum() / ((y[test] - y[test].mean()) ** 2).sum()
+        n_test[i] = test.sum()
+
+    result = pd.DataFrame(beta, columns=list(features))
+    result.insert(0, "n_test", n_test)
+    result.insert(0, "r2_test", r2)
+    result.index.name = "fold"
+    return result
@@ -0,0 +1,125 @@
+# Typed store for regression results
+#
+# Every run of a regression script is appended to a small SQLite database in
+# long format: one row per (run, specification, variable) with numeric
+# columns, plus the labels of each specification and the run metadata.
+# Reports load it with one query instead of parsing stringified dicts.
+import os
+import sqlite3
+import uuid
+from datetime import datetime, timezone
+
+import pandas as pd
+
+RESULTS_DB = "regression_results.sqlite"
+
+# Specification labels (a spec without a label stores NULL)
+SPEC_LABELS = ["target", "feature_set", "year", "position_group", "big5_only"]
+# Per-variable values
+VALUE_COLUMNS = ["coef", "std_err", "std_coef", "std_coef_err", "t", "p_value"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    script TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS specs (
+    run_id TEXT NOT NULL REFERENCES runs(run_id),
+    spec TEXT NOT NULL,
+    target TEXT,
+    feature_set TEXT,
+    year INTEGER,
+    position_group TEXT,
+    big5_only INTEGER,
+    n INTEGER NOT NULL,
+    r2 REAL NOT NULL,
+    PRIMARY KEY (run_id, spec)
+);
+CREATE TABLE IF NOT EXISTS coefficients (
+    run_id TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    variable TEXT NOT NULL,
+    coef REAL,
+    std_err REAL,
+    std_coef REAL,
+    std_coef_err REAL,
+    t REAL,
+    p_value REAL,
+    PRIMARY KEY (run_id, spec, variable),
+    FOREIGN KEY (run_id, spec) REFERENCES specs(run_id, spec)
+);
+"""
+
+
+def _connect(db_path):
+    con = sqlite3.connect(db_path)
+    con.executescript(SCHEMA)
+    return con
+
+
+def write_results(results, script, db_path=RESULTS_DB):
+    """
+    Append one run to the store and return its run_id.
+
+    results is a tidy table as returned by regression_grid.run_grid(): a
+    "spec" column, optional label columns (SPEC_LABELS), "variable", the
+    VALUE_COLUMNS that are available, and "n" / "r2" per spec.
+    """
+    run_id = uuid.uuid4().hex
+    created_at = datetime.now(timezone.utc).isoformat()
+
+    specs = results.drop_duplicates("spec")
+    specs = specs.reindex(columns=["spec"] + SPEC_LABELS + ["n", "r2"]).astype(
+        {"year": "boolean", "big5_only": "boolean"}).astype({"year": "Int64", "big5_only": "Int64"})
+    specs.insert(0, "run_id", run_id)
+    coefficients = results.reindex(columns=["spec", "variable"] + VALUE_COLUMNS)
+    coefficients.insert(0, "run_id", run_id)
+
+    with _connect(db_path) as con:
+        con.execute("INSERT INTO runs VALUES (?, ?, ?)", (run_id, script, created_at))
+        specs.to_sql("specs", con, if_exists="append", index=False)
+        coefficients.to_sql("coefficients", con, if_exists="append", index=False)
+    con.close()
+    return run_id
+
+
+def list_runs(db_path=RESULTS_DB):
+    """All stored runs, newest first."""
+    with _connect(db_path) as con:
+        runs = pd.read_sql_query("SELECT * FROM runs ORDER BY created_at DESC", con)
+    con.close()
+    return runs
+
+
+def load_results(run_id=None, script=None, db_path=RESULTS_DB):
+    """
+    Results in long format (one row per run, spec and variable, with the spec
+    labels, n and r2). run_id=None loads the latest run (of `script` if given);
+    run_id="all" loads every run, e.g. to compare coefficients across runs.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"no regression results stored in {db_path}")
+    where, params = "", []
+    if run_id is None:
+        where = "WHERE c.run_id = (SELECT run_id FROM runs {} ORDER BY created_at DESC LIMIT 1)".format(
+            "WHERE script = ?" if script else "")
+        params = [script] if script else []
+    elif run_id != "all":
+        where, params = "WHERE c.run_id = ?", [run_id]
+    elif script:
+        where, params = "WHERE r.script = ?", [script]
+
+    query = f"""
+        SELECT r.run_id, r.script, r.created_at, s.spec, {", ".join(f"s.{c}" for c in SPEC_LABELS)},
+               s.n, s.r2, c.variable, {", ".join(f"c.{c}" for c in VALUE_COLUMNS)}
+        FROM coefficients c
+        JOIN specs s ON s.run_id = c.run_id AND s.spec = c.spec
+        JOIN runs r ON r.run_id = c.run_id
+        {where}
+        ORDER BY r.created_at, c.rowid
+    """
+    with _connect(db_path) as con:
+        results = pd.read_sql_query(query, con, params=params)
+    con.close()
+    return results.astype({"year": "boolean", "big5_only": "boolean"})
@@ -0,0 +1,33 @@
+# Runs every specification of the regression grid (see regression_grid.py)
+# and writes the results into one tidy table
+import os
+import time
+
+from regression_grid import GRID, expand_grid, load_design, run_grid
+from results_store import RESULTS_DB, write_results
+
+# Worker processes (None: one per CPU, 1: fit one after another here).
+# Can also be set with the GRID_JOBS environment variable (pipeline.py --param).
+N_JOBS = int(os.environ.get("GRID_JOBS", 0)) or None
+
+if __name__ == "__main__":  # worker processes re-import this script under the "spawn" start method
+    start = time.perf_counter()
+    design = load_design()
+    specs = expand_grid(design, GRID)
+    results = run_grid(design, specs, n_jobs=N_JOBS)
+
+    n_fitted = results["spec"].nunique()
+    print(f"Fitted {n_fitted} of {len(specs)} specifications in {time.perf_counter() - start:.1f}s"
+          f" ({len(specs) - n_fitted} not estimable on their rows).")
+
+    # Performance score across the grid
+    perf = results[results["variable"] == "performance_composite_score"]
+    print(perf[["target", "feature_set", "year", "position_group", "big5_only", "std_coef", "p_value", "n", "r2"]]
+          .to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+
+    results.to_csv("regression_grid_results.csv", index=False)
+    print("Saved regression grid results to 'regression_grid_results.csv'.")
+
+    # the same table in the results store, e.g. results_store.load_results(script="run_regression_grid")
+    run_id = write_results(results, script="run_regression_grid")
+    print(f"Saved regression grid results to '{RESULTS_DB}' (run {run_id})")
@@ -0,0 +1,47 @@
+# NumPy arrays shared with worker processes through shared memory
+#
+# The parallel fits (performance_pca.fit_group_pcas, regression_grid.run_grid)
+# copy their matrix once into a shared memory block instead of pickling it to
+# every worker; the workers attach to the block in their pool initializer and
+# only receive row positions / masks per task:
+#
+#   with shared_array(X) as spec:
+#       with ProcessPoolExecutor(initializer=_attach, initargs=(spec,)) as pool:
+#           ...
+#
+#   def _attach(spec):
+#       _worker["X"] = attach(spec)
+from contextlib import contextmanager
+
+import numpy as np
+
+# Blocks attached by this (worker) process, kept open for its lifetime
+_segments = []
+
+
+@contextmanager
+def shared_array(X, order="C"):
+    """
+    Copy X into a new shared memory block (in `order` layout) and yield the
+    spec (name, shape, dtype, order) to attach() to it; the block is freed
+    when the context exits.
+    """
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+    try:
+        np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf, order=order)[:] = X
+        yield (shm.name, X.shape, X.dtype.str, order)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def attach(spec):
+    """The array of a shared_array() spec, as a view of the shared block (no copy)."""
+    from multiprocessing import shared_memory
+
+    name, shape, dtype, order = spec
+    shm = shared_memory.SharedMemory(name=name)
+    _segments.append(shm)  # keep the mapping alive for the lifetime of the worker
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf, order=order)
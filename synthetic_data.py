@@ -0,0 +1,260 @@
+# Synthetic Transfermarkt-shaped source tables for benchmarks and tests
+#
+#   python synthetic_data.py OUT_DIR [--scale 10] [--seed 0]
+#
+# The repo only ships Git LFS pointers for the CSVs, so this writes the seven
+# tables the pipeline reads (appearances, game_events, game_lineups,
+# player_valuations, transfers, players, clubs) with the same columns and
+# roughly the same shape as the real dump: careers of a few seasons, skewed
+# playing time (a few regulars, many fringe players), club sizes following a
+# Zipf-like law, mid-season and double transfers, missing values where the
+# real data has them. Scale 1 has BASE_PLAYERS players (about 250k
+# appearances); scale 10 is of the order of the real dump.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from features import DEFENSIVE_KEYWORDS, TOP10_COUNTRIES
+from performance_pca import POSITION_GROUPS
+
+BASE_PLAYERS = 3_000
+BASE_CLUBS = 45
+FIRST_YEAR, LAST_YEAR = 2012, 2024
+
+BIG5_IDS = ["GB1", "ES1", "IT1", "L1", "FR1"]
+OTHER_COMPETITIONS = ["NL1", "PO1", "TR1", "BE1", "RU1", "SC1", "GR1", "DK1", "UKR1", "A1", "C1"]
+
+SUB_POSITIONS = [p for members in POSITION_GROUPS.values() for p in members if p != "Keeper"]
+# share of players per sub_position (about 10% goalkeepers, as in players.csv)
+SUB_POSITION_WEIGHTS = np.array([12, 7, 7, 2, 5, 11, 9, 3, 3, 13, 7, 7, 10], dtype=float)
+GOAL_RATE = {"Attackers": 0.35, "Midfielders": 0.12, "Defenders": 0.04, "Goalkeepers": 0.0}
+
+OTHER_COUNTRIES = ["Netherlands", "Belgium", "Turkey", "Scotland", "Austria", "Denmark", "Japan",
+                   "Ghana", "Nigeria", "Croatia", "Serbia", "Poland", "Greece", "Mexico", "Norway"]
+
+EVENT_DESCRIPTIONS = [
+    ", Right-footed shot, Tackle", ", Interception", ", Clearance, Header", ", Shot blocked",
+    ", Left-footed shot, Save", ", Penalty Save", ", Foul", ", Yellow card, Foul", ", Not reported",
+    ", Right-footed shot, 2. Tournament Goal Assist: , Pass, 1. Tournament Assist",
+]
+
+
+def _dates_in_years(rng, years, month_lo=1, month_hi=12):
+    """A random date in [month_lo, month_hi] of each given year."""
+    start = pd.to_datetime(pd.DataFrame({"year": years, "month": month_lo, "day": 1}))
+    end = pd.to_datetime(pd.DataFrame({"year": years, "month": month_hi, "day": 1})) + pd.offsets.MonthEnd(0)
+    span = (end - start).dt.days.to_numpy() + 1
+    return start + pd.to_timedelta((rng.random(len(years)) * span).astype(np.int64), unit="D")
+
+
+def _ids(prefix, n):
+    return (prefix + pd.Series(np.arange(n)).astype(str)).to_numpy()
+
+
+def _fmt(dates):
+    return pd.Series(dates).dt.strftime("%Y-%m-%d").to_numpy()
+
+
+def make_clubs(rng, n_clubs):
+    competitions = np.where(rng.random(n_clubs) < 0.3,
+                            rng.choice(BIG5_IDS, n_clubs), rng.choice(OTHER_COMPETITIONS, n_clubs))
+    return pd.DataFrame({
+        "club_id": np.sort(rng.choice(np.arange(1, 50 * n_clubs), n_clubs, replace=False)),
+        "club_code": [f"club-{i}" for i in range(n_clubs)],
+        "name": [f"Club {i}" for i in range(n_clubs)],
+        "domestic_competition_id": competitions,
+        "total_market_value": np.nan,
+        "squad_size": rng.integers(20, 40, n_clubs),
+    })
+
+
+def make_players(rng, n_players):
+    dob = pd.to_datetime("1975-01-01") + pd.to_timedelta(rng.integers(0, 365 * 31, n_players), unit="D")
+    countries = np.array(TOP10_COUNTRIES + OTHER_COUNTRIES, dtype=object)
+    weights = np.r_[np.full(len(TOP10_COUNTRIES), 5.0), np.ones(len(OTHER_COUNTRIES))]
+    players = pd.DataFrame({
+        "player_id": np.sort(rng.choice(np.arange(1, 400 * n_players), n_players, replace=False)),
+        "name": _ids("Player ", n_players),
+        "country_of_citizenship": rng.choice(countries, n_players, p=weights / weights.sum()),
+        "date_of_birth": _fmt(dob),
+        "sub_position": rng.choice(SUB_POSITIONS, n_players, p=SUB_POSITION_WEIGHTS / SUB_POSITION_WEIGHTS.sum()),
+        "foot": rng.choice(np.array(["right", "left", "both"], dtype=object), n_players, p=[0.72, 0.22, 0.06]),
+        "height_in_cm": np.round(rng.normal(181, 7, n_players)),
+    })
+    group_of = {p: g for g, members in POSITION_GROUPS.items() for p in members}
+    players["position"] = players["sub_position"].map(group_of).map(
+        {"Attackers": "Attack", "Midfielders": "Midfield", "Defenders": "Defender", "Goalkeepers": "Goalkeeper"})
+    # missing values roughly as often as in players.csv
+    for col, share in [("country_of_citizenship", 0.01), ("date_of_birth", 0.005), ("sub_position", 0.01),
+                       ("foot", 0.05), ("height_in_cm", 0.07)]:
+        players.loc[rng.random(n_players) < share, col] = np.nan
+    return players
+
+
+def make_seasons(rng, players, clubs):
+    """One row per player-season with the player's club (clubs change between seasons)."""
+    n = len(players)
+    birth_year = pd.to_datetime(players["date_of_birth"]).dt.year.fillna(1990).to_numpy().astype(int)
+    first = np.clip(birth_year + rng.integers(17, 23, n), FIRST_YEAR, LAST_YEAR)
+    length = np.minimum(rng.geometric(0.15, n), LAST_YEAR - first + 1)
+    player_ix = np.repeat(np.arange(n), length)
+    offset = np.arange(len(player_ix)) - np.repeat(np.cumsum(length) - length, length)
+    seasons = pd.DataFrame({"player_ix": player_ix, "year": first[player_ix] + offset})
+
+    # club sizes ~ Zipf; a player moves with probability 0.2 per season
+    club_weights = 1.0 / np.arange(1, len(clubs) + 1) ** 0.8
+    club_weights /= club_weights.sum()
+    draws = rng.choice(len(clubs), len(seasons), p=club_weights)
+    moves = (offset == 0) | (rng.random(len(seasons)) < 0.2)
+    # keep the previous club unless the player moved (forward fill over the season index)
+    last_move = np.maximum.accumulate(np.where(moves, np.arange(len(seasons)), 0))
+    seasons["club_ix"] = draws[last_move]
+    seasons["moved"] = moves & (offset > 0)
+
+    # playing time: regulars and fringe players (lognormal)
+    activity = rng.lognormal(0, 0.9, n)
+    seasons["activity"] = activity[player_ix]
+    return seasons
+
+
+def make_appearances(rng, players, clubs, seasons):
+    n_games = np.minimum(rng.poisson(12 * seasons["activity"].to_numpy()), 60)
+    season_ix = np.repeat(np.arange(len(seasons)), n_games)
+    s = seasons.iloc[season_ix]
+    p = players.iloc[s["player_ix"].to_numpy()]
+    n = len(season_ix)
+
+    dates = _dates_in_years(rng, s["year"].to_numpy())
+    minutes = np.where(rng.random(n) < 0.6, 90, rng.integers(1, 90, n))
+    group_of = {q: g for g, members in POSITION_GROUPS.items() for q in members}
+    goal_rate = p["sub_position"].map(group_of).map(GOAL_RATE).fillna(0.05).to_numpy() * minutes / 90
+    game_id = rng.integers(2_000_000, 2_000_000 + max(n // 20, 1000), n)
+    club_id = clubs["club_id"].to_numpy()[s["club_ix"].to_numpy()]
+
+    return pd.DataFrame({
+        "appearance_id": (pd.Series(game_id).astype(str) + "_" + p["player_id"].astype(str).to_numpy()).to_numpy(),
+        "game_id": game_id,
+        "player_id": p["player_id"].to_numpy(),
+        "player_club_id": club_id,
+        "player_current_club_id": club_id,
+        "date": _fmt(dates),
+        "player_name": p["name"].to_numpy(),
+        "competition_id": clubs["domestic_competition_id"].to_numpy()[s["club_ix"].to_numpy()],
+        "yellow_cards": (rng.random(n) < 0.12).astype(int),
+        "red_cards": (rng.random(n) < 0.005).astype(int),
+        "goals": rng.poisson(goal_rate),
+        "assists": rng.poisson(goal_rate * 0.7),
+        "minutes_played": minutes,
+    })
+
+
+def make_lineups(rng, appearances):
+    """One lineup row per appearance (started if 60+ minutes) plus unused substitutes."""
+    starters = appearances["minutes_played"].to_numpy() >= 60
+    lineups = appearances[["date", "game_id", "player_id", "player_club_id", "player_name"]].rename(
+        columns={"player_club_id": "club_id"})
+    lineups["type"] = np.where(starters, "starting_lineup", "substitutes")
+    bench = lineups.sample(frac=0.3, random_state=int(rng.integers(1 << 31)))
+    bench = bench.assign(type="substitutes")
+    lineups = pd.concat([lineups, bench], ignore_index=True).sort_values("date", kind="stable", ignore_index=True)
+    lineups.insert(0, "game_lineups_id", _ids("l", len(lineups)))
+    lineups["number"] = rng.integers(1, 40, len(lineups))
+    lineups["team_captain"] = (rng.random(len(lineups)) < 0.05).astype(int)
+    return lineups
+
+
+def make_events(rng, appearances):
+    n_events = rng.poisson(0.6, len(appearances))
+    a = appearances.iloc[np.repeat(np.arange(len(appearances)), n_events)]
+    n = len(a)
+    keyword_share = 0.5
+    descriptions = np.array(EVENT_DESCRIPTIONS + [f", {k}" for k in DEFENSIVE_KEYWORDS], dtype=object)
+    weights = np.r_[np.full(len(EVENT_DESCRIPTIONS), (1 - keyword_share) / len(EVENT_DESCRIPTIONS)),
+                    np.full(len(DEFENSIVE_KEYWORDS), keyword_share / len(DEFENSIVE_KEYWORDS))]
+    return pd.DataFrame({
+        "game_event_id": _ids("e", n),
+        "date": a["date"].to_numpy(),
+        "game_id": a["game_id"].to_numpy(),
+        "minute": rng.integers(1, 91, n),
+        "type": rng.choice(["Cards", "Goals", "Substitutions", "Shootout"], n, p=[0.4, 0.3, 0.28, 0.02]),
+        "club_id": a["player_club_id"].to_numpy(),
+        "player_id": a["player_id"].to_numpy(),
+        "description": np.where(rng.random(n) < 0.05, None, rng.choice(descriptions, n, p=weights)),
+        "player_in_id": np.nan,
+        "player_assist_id": np.nan,
+    })
+
+
+def make_valuations(rng, players, clubs, seasons):
+    """1-3 valuations per player-season; value ~ player quality x age curve x club size."""
+    per_season = rng.integers(1, 4, len(seasons))
+    s = seasons.iloc[np.repeat(np.arange(len(seasons)), per_season)]
+    p = players.iloc[s["player_ix"].to_numpy()]
+    birth_year = pd.to_datetime(p["date_of_birth"]).dt.year.fillna(1990).to_numpy()
+    age = s["year"].to_numpy() - birth_year
+    quality = np.log(s["activity"].to_numpy() + 0.1)
+    log_value = 13.5 + 0.8 * quality - 0.01 * (age - 27) ** 2 - 0.3 * np.log1p(s["club_ix"].to_numpy())
+    value = np.round(np.exp(log_value + rng.normal(0, 0.5, len(s))), -4)
+    return pd.DataFrame({
+        "player_id": p["player_id"].to_numpy(),
+        "date": _fmt(_dates_in_years(rng, s["year"].to_numpy())),
+        "market_value_in_eur": value,
+        "current_club_id": clubs["club_id"].to_numpy()[s["club_ix"].to_numpy()],
+    })
+
+
+def make_transfers(rng, players, clubs, seasons):
+    """A transfer for every club change (summer window), a few also in winter: some players move twice a year."""
+    moved = seasons[seasons["moved"].to_numpy()]
+    winter = moved.sample(frac=0.15, random_state=int(rng.integers(1 << 31)))
+    rows = pd.concat([moved.assign(winter=False), winter.assign(winter=True)], ignore_index=True)
+    years = rows["year"].to_numpy()
+    dates = np.where(rows["winter"].to_numpy(), _dates_in_years(rng, years, 1, 1), _dates_in_years(rng, years, 6, 8))
+    n = len(rows)
+    fee = np.round(np.exp(rng.normal(14, 1.5, n)), -4)
+    fee = np.where(rng.random(n) < 0.3, 0.0, fee)     # free transfers / loans
+    fee = np.where(rng.random(n) < 0.35, np.nan, fee)  # undisclosed
+    return pd.DataFrame({
+        "player_id": players["player_id"].to_numpy()[rows["player_ix"].to_numpy()],
+        "transfer_date": _fmt(pd.to_datetime(dates)),
+        "transfer_season": (pd.Series(years % 100).map("{:02d}".format) + "/"
+                            + pd.Series((years + 1) % 100).map("{:02d}".format)).to_numpy(),
+        "from_club_id": clubs["club_id"].to_numpy()[rng.integers(0, len(clubs), n)],
+        "to_club_id": clubs["club_id"].to_numpy()[rows["club_ix"].to_numpy()],
+        "transfer_fee": fee,
+    }).sort_values("transfer_date", kind="stable", ignore_index=True)
+
+
+def generate(out_dir, scale=1.0, seed=0):
+    """Write the seven source CSVs for `scale` x BASE_PLAYERS players into out_dir; returns {table: rows}."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    clubs = make_clubs(rng, max(int(BASE_CLUBS * scale), 20))
+    players = make_players(rng, int(BASE_PLAYERS * scale))
+    seasons = make_seasons(rng, players, clubs)
+    appearances = make_appearances(rng, players, clubs, seasons)
+    tables = {
+        "clubs": clubs,
+        "players": players,
+        "appearances": appearances,
+        "game_lineups": make_lineups(rng, appearances),
+        "game_events": make_events(rng, appearances),
+        "player_valuations": make_valuations(rng, players, clubs, seasons),
+        "transfers": make_transfers(rng, players, clubs, seasons),
+    }
+    for name, df in tables.items():
+        df.to_csv(os.path.join(out_dir, f"{name}.csv"), index=False)
+    return {name: len(df) for name, df in tables.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic Transfermarkt-shaped CSVs.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiple of BASE_PLAYERS players (1, 10, 100, ...)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for name, rows in generate(args.out_dir, args.scale, args.seed).items():
+        print(f"{name}: {rows:,} rows")